@@ -285,7 +285,7 @@ def load_sales_csv_data(file):
                           'Received from Affiliate', 'Total', 'Subtotal', 'Gross',
                           'Processing Fee', 'Net', 'Payment Processing Fee', 'Payment Net',
                           'Refund Processing Fee', 'Refund Net', 'Subtotal Paid',
-                          'Dashboard Tax Rate (5%) Paid', 'Tax Paid']
+                          'Dashboard Tax Rate (5%) Paid', 'Tax Paid', 'Total Tax']
 
         for col in numeric_columns:
             if col in df.columns:
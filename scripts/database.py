@@ -16,7 +16,7 @@ def get_database_connection():
         return None
 
 def execute_query(query, params=None):
-    """Execute a database query and return results"""
+    """Execute a database query and return results (a list of param dicts runs it as one executemany)"""
     engine = get_database_connection()
     if engine is None:
         return None
@@ -10,7 +10,9 @@ This module contains all journal export functionality including:
 
 import streamlit as st
 import pandas as pd
+import numpy as np
 from datetime import datetime
+from functools import lru_cache
 from scripts.database import execute_query
 
 
@@ -24,17 +26,7 @@ def create_enhanced_quickbooks_journal(pivot_df, raw_df, include_processing_fees
         qb_mappings = get_quickbooks_mappings()
 
         # Get fee mappings for detailed breakdown
-        fee_mappings = execute_query("""
-            SELECT t.name as tour_name, f.name as fee_name, f.per_person_amount
-            FROM tour_fees tf
-            JOIN tours t ON tf.tour_id = t.id
-            JOIN fees f ON tf.fee_id = f.id
-            ORDER BY t.name, f.name
-        """)
-
-        fee_mappings_df = pd.DataFrame(fee_mappings, columns=['tour_name', 'fee_name', 'per_person_amount']) if fee_mappings else pd.DataFrame()
-        if not fee_mappings_df.empty:
-            fee_mappings_df['per_person_amount'] = pd.to_numeric(fee_mappings_df['per_person_amount'], errors='coerce').fillna(0)
+        fee_mappings_df = get_tour_fee_mappings()
 
         entry_number = 1
         total_vat_amount = 0
@@ -587,6 +579,48 @@ def create_enhanced_quickbooks_journal(pivot_df, raw_df, include_processing_fees
         return pd.DataFrame(), 0, 0, {}, {}, {}
 
 
+def calculate_payment_totals_by_type(pivot_df, bookings, include_processing_fees=False):
+    """
+    Total gross payments (Subtotal Paid + Tax Paid) and processing fees per payment type
+    for the tours in pivot_df.
+
+    All (tour, payment type) pairs are summed in one groupby; the per-type totals are then
+    accumulated in pivot tour order so the dict order matches the journal line order.
+    """
+    def amount(col):
+        if col in bookings.columns:
+            return pd.to_numeric(bookings[col], errors='coerce').fillna(0)
+        return pd.Series(0.0, index=bookings.index)
+
+    rows = pd.DataFrame({
+        'Item': bookings['Item'],
+        'Payment Type': bookings['Payment Type'] if 'Payment Type' in bookings.columns else 'Unknown',
+        'Base Payment': amount('Subtotal Paid') + amount('Tax Paid'),
+        'Processing Fee': amount('Processing Fee'),
+    })
+    rows = rows[rows['Item'].isin(pivot_df['Tour Name'])]
+
+    payment_sums = rows.groupby(['Item', 'Payment Type'], sort=False, dropna=False)['Base Payment'].sum()
+    if include_processing_fees:
+        fee_rows = rows[rows['Processing Fee'] != 0]
+        fee_sums = fee_rows.groupby(['Item', 'Payment Type'], sort=False, dropna=False)['Processing Fee'].sum()
+    else:
+        fee_sums = pd.Series(dtype=float)
+
+    def totals_by_type(sums):
+        by_tour = {}
+        for (tour_name, payment_type), total in sums.items():
+            by_tour.setdefault(tour_name, []).append((payment_type, total))
+
+        totals = {}
+        for tour_name in pivot_df['Tour Name']:
+            for payment_type, total in by_tour.get(tour_name, []):
+                totals[payment_type] = totals.get(payment_type, 0) + total
+        return totals
+
+    return totals_by_type(payment_sums), totals_by_type(fee_sums)
+
+
 def calculate_proportional_fees_v2(subtotal_paid, subtotal_total, total_fees_for_booking):
     """
     Calculate proportional fees based on partial payment
@@ -618,17 +652,7 @@ def create_enhanced_quickbooks_journal_api_v2(pivot_df, raw_df, include_processi
         qb_mappings = get_quickbooks_mappings()
 
         # Get fee mappings for detailed breakdown
-        fee_mappings = execute_query("""
-            SELECT t.name as tour_name, f.name as fee_name, f.per_person_amount
-            FROM tour_fees tf
-            JOIN tours t ON tf.tour_id = t.id
-            JOIN fees f ON tf.fee_id = f.id
-            ORDER BY t.name, f.name
-        """)
-
-        fee_mappings_df = pd.DataFrame(fee_mappings, columns=['tour_name', 'fee_name', 'per_person_amount']) if fee_mappings else pd.DataFrame()
-        if not fee_mappings_df.empty:
-            fee_mappings_df['per_person_amount'] = pd.to_numeric(fee_mappings_df['per_person_amount'], errors='coerce').fillna(0)
+        fee_mappings_df = get_tour_fee_mappings()
 
         entry_number = 1
         total_vat_amount = 0
@@ -659,59 +683,11 @@ def create_enhanced_quickbooks_journal_api_v2(pivot_df, raw_df, include_processi
 
         # V2 filtering already excludes affiliate payments, so no separate affiliate processing needed
 
-        # Calculate total payments by payment type from ALL bookings (V2 filtered)
-        total_payments_by_type = {}
-        total_processing_fees_by_type = {}  # Track processing fees separately
-
-        # Process all V2-filtered bookings payments
-        for _, row in pivot_df.iterrows():
-            tour_name = row['Tour Name']
-            # Use all V2-filtered booking transactions for payments
-            tour_transactions = direct_bookings[direct_bookings['Item'] == tour_name].copy()
-
-            if not tour_transactions.empty:
-                # Calculate payment breakdown using Subtotal Paid + Tax Paid
-                tour_payment_breakdown = {}
-                tour_processing_fee_breakdown = {}
-
-                for _, transaction in tour_transactions.iterrows():
-                    payment_type = transaction.get('Payment Type', 'Unknown')
-                    subtotal_paid = pd.to_numeric(transaction.get('Subtotal Paid', 0), errors='coerce')
-                    tax_paid = pd.to_numeric(transaction.get('Tax Paid', 0), errors='coerce')
-                    processing_fee = pd.to_numeric(transaction.get('Processing Fee', 0), errors='coerce')
-
-                    # Base payment amount (always use gross amount for clearing accounts)
-                    base_payment = subtotal_paid + tax_paid
-
-                    # Always use gross payment amount for clearing accounts
-                    # Processing fees will be handled as separate credit entries
-
-                    # Aggregate payment amounts (gross)
-                    if payment_type in tour_payment_breakdown:
-                        tour_payment_breakdown[payment_type] += base_payment
-                    else:
-                        tour_payment_breakdown[payment_type] = base_payment
-
-                    # Aggregate processing fees if enabled
-                    if include_processing_fees and processing_fee != 0:
-                        if payment_type in tour_processing_fee_breakdown:
-                            tour_processing_fee_breakdown[payment_type] += processing_fee
-                        else:
-                            tour_processing_fee_breakdown[payment_type] = processing_fee
-
-                # Add to overall totals
-                for payment_type, amount in tour_payment_breakdown.items():
-                    if payment_type in total_payments_by_type:
-                        total_payments_by_type[payment_type] += amount
-                    else:
-                        total_payments_by_type[payment_type] = amount
-
-                # Add processing fees to overall totals
-                for payment_type, fee_amount in tour_processing_fee_breakdown.items():
-                    if payment_type in total_processing_fees_by_type:
-                        total_processing_fees_by_type[payment_type] += fee_amount
-                    else:
-                        total_processing_fees_by_type[payment_type] = fee_amount
+        # Calculate total payments by payment type from ALL bookings (V2 filtered),
+        # with processing fees tracked separately
+        total_payments_by_type, total_processing_fees_by_type = calculate_payment_totals_by_type(
+            pivot_df, direct_bookings, include_processing_fees
+        )
 
         # No separate affiliate payment processing needed - V2 filter excludes these
 
@@ -1246,17 +1222,7 @@ def create_enhanced_quickbooks_journal_v2(pivot_df, raw_df, include_processing_f
         qb_mappings = get_quickbooks_mappings()
 
         # Get fee mappings for detailed breakdown
-        fee_mappings = execute_query("""
-            SELECT t.name as tour_name, f.name as fee_name, f.per_person_amount
-            FROM tour_fees tf
-            JOIN tours t ON tf.tour_id = t.id
-            JOIN fees f ON tf.fee_id = f.id
-            ORDER BY t.name, f.name
-        """)
-
-        fee_mappings_df = pd.DataFrame(fee_mappings, columns=['tour_name', 'fee_name', 'per_person_amount']) if fee_mappings else pd.DataFrame()
-        if not fee_mappings_df.empty:
-            fee_mappings_df['per_person_amount'] = pd.to_numeric(fee_mappings_df['per_person_amount'], errors='coerce').fillna(0)
+        fee_mappings_df = get_tour_fee_mappings()
 
         entry_number = 1
         total_vat_amount = 0
@@ -1265,6 +1231,15 @@ def create_enhanced_quickbooks_journal_v2(pivot_df, raw_df, include_processing_f
         # Use all remaining bookings (no need to separate by Affiliate column since V2 filter handles this)
         direct_bookings = raw_df.copy()
 
+        # Coerce the amount columns once up front instead of per row inside the loops below
+        for col in ['Subtotal Paid', 'Subtotal', '# of Pax', 'Tax Paid', 'Processing Fee']:
+            if col in direct_bookings.columns:
+                direct_bookings[col] = pd.to_numeric(direct_bookings[col], errors='coerce').fillna(0)
+            else:
+                direct_bookings[col] = 0.0
+        if 'Payment Type' not in direct_bookings.columns:
+            direct_bookings['Payment Type'] = 'Unknown'
+
         # Separate payments and refunds
         payments_df = raw_df[raw_df['Payment or Refund'] == 'Payment'].copy()
         refunds_df = raw_df[raw_df['Payment or Refund'] == 'Refund'].copy()
@@ -1287,59 +1262,11 @@ def create_enhanced_quickbooks_journal_v2(pivot_df, raw_df, include_processing_f
 
         # V2 filtering already excludes affiliate payments, so no separate affiliate processing needed
 
-        # Calculate total payments by payment type from ALL bookings (V2 filtered)
-        total_payments_by_type = {}
-        total_processing_fees_by_type = {}  # Track processing fees separately
-
-        # Process all V2-filtered bookings payments
-        for _, row in pivot_df.iterrows():
-            tour_name = row['Tour Name']
-            # Use all V2-filtered booking transactions for payments
-            tour_transactions = direct_bookings[direct_bookings['Item'] == tour_name].copy()
-
-            if not tour_transactions.empty:
-                # Calculate payment breakdown using Subtotal Paid + Tax Paid
-                tour_payment_breakdown = {}
-                tour_processing_fee_breakdown = {}
-                
-                for _, transaction in tour_transactions.iterrows():
-                    payment_type = transaction.get('Payment Type', 'Unknown')
-                    subtotal_paid = pd.to_numeric(transaction.get('Subtotal Paid', 0), errors='coerce')
-                    tax_paid = pd.to_numeric(transaction.get('Tax Paid', 0), errors='coerce')
-                    processing_fee = pd.to_numeric(transaction.get('Processing Fee', 0), errors='coerce')
-                    
-                    # Base payment amount (always use gross amount for clearing accounts)
-                    base_payment = subtotal_paid + tax_paid
-
-                    # Always use gross payment amount for clearing accounts
-                    # Processing fees will be handled as separate credit entries
-                    
-                    # Aggregate payment amounts (gross)
-                    if payment_type in tour_payment_breakdown:
-                        tour_payment_breakdown[payment_type] += base_payment
-                    else:
-                        tour_payment_breakdown[payment_type] = base_payment
-                    
-                    # Aggregate processing fees if enabled
-                    if include_processing_fees and processing_fee != 0:
-                        if payment_type in tour_processing_fee_breakdown:
-                            tour_processing_fee_breakdown[payment_type] += processing_fee
-                        else:
-                            tour_processing_fee_breakdown[payment_type] = processing_fee
-
-                # Add to overall totals
-                for payment_type, amount in tour_payment_breakdown.items():
-                    if payment_type in total_payments_by_type:
-                        total_payments_by_type[payment_type] += amount
-                    else:
-                        total_payments_by_type[payment_type] = amount
-                
-                # Add processing fees to overall totals
-                for payment_type, fee_amount in tour_processing_fee_breakdown.items():
-                    if payment_type in total_processing_fees_by_type:
-                        total_processing_fees_by_type[payment_type] += fee_amount
-                    else:
-                        total_processing_fees_by_type[payment_type] = fee_amount
+        # Calculate total payments by payment type from ALL bookings (V2 filtered),
+        # with processing fees tracked separately
+        total_payments_by_type, total_processing_fees_by_type = calculate_payment_totals_by_type(
+            pivot_df, direct_bookings, include_processing_fees
+        )
 
         # No separate affiliate payment processing needed - V2 filter handles this
 
@@ -1357,11 +1284,9 @@ def create_enhanced_quickbooks_journal_v2(pivot_df, raw_df, include_processing_f
         # 1. Tour Revenue - PAYMENTS (Credits) - V2 Filtered
         payment_revenue_by_tour = {}
         
-        for _, row in direct_payments.iterrows():
-            tour_name = row.get('Item', 'Unknown Tour')
-            subtotal_paid = pd.to_numeric(row.get('Subtotal Paid', 0), errors='coerce')
-            subtotal_total = pd.to_numeric(row.get('Subtotal', 0), errors='coerce')
-            guests = pd.to_numeric(row.get('# of Pax', 0), errors='coerce')
+        for tour_name, subtotal_paid, subtotal_total, guests in direct_payments[
+            ['Item', 'Subtotal Paid', 'Subtotal', '# of Pax']
+        ].itertuples(index=False, name=None):
             
             # Calculate total fees for this booking (full booking)
             total_fees_for_booking = 0
@@ -1399,11 +1324,9 @@ def create_enhanced_quickbooks_journal_v2(pivot_df, raw_df, include_processing_f
         # 2. Tour Revenue - REFUNDS (Debits) - V2 Filtered
         refund_revenue_by_tour = {}
         
-        for _, row in direct_refunds.iterrows():
-            tour_name = row.get('Item', 'Unknown Tour')
-            subtotal_paid = pd.to_numeric(row.get('Subtotal Paid', 0), errors='coerce')
-            subtotal_total = pd.to_numeric(row.get('Subtotal', 0), errors='coerce')
-            guests = pd.to_numeric(row.get('# of Pax', 0), errors='coerce')
+        for tour_name, subtotal_paid, subtotal_total, guests in direct_refunds[
+            ['Item', 'Subtotal Paid', 'Subtotal', '# of Pax']
+        ].itertuples(index=False, name=None):
             
             # Calculate total fees for this booking (full booking)
             total_fees_for_booking = 0
@@ -1445,11 +1368,9 @@ def create_enhanced_quickbooks_journal_v2(pivot_df, raw_df, include_processing_f
         # 3. Fee Revenue - PAYMENTS (Credits) and REFUNDS (Debits) - Split separately - V2
         # Calculate fee revenue from payments (positive) - using proportional fees
         fee_revenue_payments = {}
-        for _, row in direct_payments.iterrows():
-            tour_name = row.get('Item', 'Unknown Tour')
-            subtotal_paid = pd.to_numeric(row.get('Subtotal Paid', 0), errors='coerce')
-            subtotal_total = pd.to_numeric(row.get('Subtotal', 0), errors='coerce')
-            guests = pd.to_numeric(row.get('# of Pax', 0), errors='coerce')
+        for tour_name, subtotal_paid, subtotal_total, guests in direct_payments[
+            ['Item', 'Subtotal Paid', 'Subtotal', '# of Pax']
+        ].itertuples(index=False, name=None):
             
             if not fee_mappings_df.empty and guests > 0:
                 tour_fees = fee_mappings_df[fee_mappings_df['tour_name'] == tour_name]
@@ -1492,11 +1413,9 @@ def create_enhanced_quickbooks_journal_v2(pivot_df, raw_df, include_processing_f
         
         # Calculate fee revenue from refunds (negative - create debits) - using proportional fees
         fee_revenue_refunds = {}
-        for _, row in direct_refunds.iterrows():
-            tour_name = row.get('Item', 'Unknown Tour')
-            subtotal_paid = pd.to_numeric(row.get('Subtotal Paid', 0), errors='coerce')
-            subtotal_total = pd.to_numeric(row.get('Subtotal', 0), errors='coerce')
-            guests = pd.to_numeric(row.get('# of Pax', 0), errors='coerce')
+        for tour_name, subtotal_paid, subtotal_total, guests in direct_refunds[
+            ['Item', 'Subtotal Paid', 'Subtotal', '# of Pax']
+        ].itertuples(index=False, name=None):
             
             if not fee_mappings_df.empty and guests > 0:
                 tour_fees = fee_mappings_df[fee_mappings_df['tour_name'] == tour_name]
@@ -1739,18 +1658,10 @@ def create_v2_detailed_records(v2_filtered_df):
         v2_detailed_records = v2_detailed_records[available_columns]
 
         # Get fee mappings for detailed fee breakdown
-        fee_mappings = execute_query("""
-            SELECT t.name as tour_name, f.name as fee_name, f.per_person_amount
-            FROM tour_fees tf
-            JOIN tours t ON tf.tour_id = t.id
-            JOIN fees f ON tf.fee_id = f.id
-            ORDER BY t.name, f.name
-        """)
+        fee_mappings_df = get_tour_fee_mappings()
 
         # Add fee breakdown columns
-        if fee_mappings:
-            fee_mappings_df = pd.DataFrame(fee_mappings, columns=['tour_name', 'fee_name', 'per_person_amount'])
-            fee_mappings_df['per_person_amount'] = pd.to_numeric(fee_mappings_df['per_person_amount'], errors='coerce').fillna(0)
+        if not fee_mappings_df.empty:
 
             # Get unique fee names for column headers
             unique_fees = fee_mappings_df['fee_name'].unique()
@@ -1817,6 +1728,37 @@ def create_v2_detailed_records(v2_filtered_df):
         return pd.DataFrame()
 
 
+# Process-wide version of the tour/fee and QuickBooks mapping config. Results cached from that
+# config take it as a key argument, and every write bumps it so they are rebuilt
+_mappings_version = 0
+
+def get_mappings_version():
+    """Return the current version of the tour/fee and QuickBooks mapping config"""
+    return _mappings_version
+
+def bump_mappings_version():
+    """Invalidate everything derived from tours, fees and mappings after a write"""
+    global _mappings_version
+    _mappings_version += 1
+    get_tour_fee_mappings.clear()
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def get_tour_fee_mappings():
+    """Retrieve tour-fee mappings as a DataFrame (cached for 5 minutes, cleared when mappings are edited)"""
+    mappings = execute_query("""
+        SELECT t.name as tour_name, f.name as fee_name, f.per_person_amount
+        FROM tour_fees tf
+        JOIN tours t ON tf.tour_id = t.id
+        JOIN fees f ON tf.fee_id = f.id
+        ORDER BY t.name, f.name
+    """)
+
+    mappings_df = pd.DataFrame(mappings or [], columns=['tour_name', 'fee_name', 'per_person_amount'])
+    mappings_df['per_person_amount'] = pd.to_numeric(mappings_df['per_person_amount'], errors='coerce').fillna(0)
+    return mappings_df
+
+
 def get_quickbooks_mappings():
     """Retrieve QuickBooks account mappings from database"""
     try:
@@ -1875,37 +1817,39 @@ def get_fallback_mappings():
     }
 
 
+# Map payment types to GL accounts (partial matches are checked in this order)
+PAYMENT_ACCOUNT_MAPPING = {
+    'credit card': 'Credit Card Clearing',
+    'mastercard': 'Credit Card Clearing',
+    'visa': 'Credit Card Clearing',
+    'amex': 'Credit Card Clearing',
+    'american express': 'Credit Card Clearing',
+    'affiliate': 'Affiliate Receivable',
+    'cash': 'Cash - Operating',
+    'check': 'Undeposited Funds',
+    'cheque': 'Undeposited Funds',
+    'bank transfer': 'Bank Transfer Clearing',
+    'wire transfer': 'Bank Transfer Clearing',
+    'paypal': 'PayPal Clearing',
+    'square': 'Square Clearing',
+    'stripe': 'Stripe Clearing',
+    'gift card': 'Gift Card Liability',
+    'voucher': 'Voucher Clearing',
+    'refund': 'Refunds Payable'
+}
+
+
+@lru_cache(maxsize=256)
 def get_payment_account(payment_type):
-    """Map payment type to appropriate GL account"""
+    """Map payment type to appropriate GL account (cached per distinct payment type)"""
     payment_type_lower = payment_type.lower().strip()
 
-    # Map payment types to GL accounts
-    account_mapping = {
-        'credit card': 'Credit Card Clearing',
-        'mastercard': 'Credit Card Clearing',
-        'visa': 'Credit Card Clearing',
-        'amex': 'Credit Card Clearing',
-        'american express': 'Credit Card Clearing',
-        'affiliate': 'Affiliate Receivable',
-        'cash': 'Cash - Operating',
-        'check': 'Undeposited Funds',
-        'cheque': 'Undeposited Funds',
-        'bank transfer': 'Bank Transfer Clearing',
-        'wire transfer': 'Bank Transfer Clearing',
-        'paypal': 'PayPal Clearing',
-        'square': 'Square Clearing',
-        'stripe': 'Stripe Clearing',
-        'gift card': 'Gift Card Liability',
-        'voucher': 'Voucher Clearing',
-        'refund': 'Refunds Payable'
-    }
-
     # Check for exact matches first
-    if payment_type_lower in account_mapping:
-        return account_mapping[payment_type_lower]
+    if payment_type_lower in PAYMENT_ACCOUNT_MAPPING:
+        return PAYMENT_ACCOUNT_MAPPING[payment_type_lower]
 
     # Check for partial matches
-    for key, account in account_mapping.items():
+    for key, account in PAYMENT_ACCOUNT_MAPPING.items():
         if key in payment_type_lower:
             return account
 
@@ -1951,11 +1895,10 @@ def create_tour_pivot_table(df):
 
         # Ensure Total Tax is numeric before aggregation
         if 'Total Tax' in df.columns:
-            # Handle both string values with $ signs and already numeric values
+            # Only string values with $ signs need converting; numeric columns (as loaded by
+            # load_sales_csv_data) are left alone so the caller's frame is not written to
             if df['Total Tax'].dtype == 'object':
                 df['Total Tax'] = pd.to_numeric(df['Total Tax'].str.replace('$', '').str.replace(',', ''), errors='coerce').fillna(0)
-            else:
-                df['Total Tax'] = pd.to_numeric(df['Total Tax'], errors='coerce').fillna(0)
 
         if not agg_dict:
             st.error("❌ No numeric columns found for aggregation.")
@@ -1998,59 +1941,47 @@ def calculate_fee_splits(pivot_df):
     """Calculate tour revenue vs fee revenue splits using database mappings"""
     try:
         # Get tour-fee mappings from database
-        mappings = execute_query("""
-            SELECT t.name as tour_name, f.name as fee_name, f.per_person_amount
-            FROM tour_fees tf
-            JOIN tours t ON tf.tour_id = t.id
-            JOIN fees f ON tf.fee_id = f.id
-            ORDER BY t.name, f.name
-        """)
+        mappings_df = get_tour_fee_mappings()
 
-        if not mappings:
+        if mappings_df.empty:
             st.info("💡 No tour-fee mappings found in database. Showing raw revenue data.")
             return pivot_df
 
-        # Convert mappings to DataFrame for easier processing
-        mappings_df = pd.DataFrame(mappings, columns=['tour_name', 'fee_name', 'per_person_amount'])
-        mappings_df['per_person_amount'] = pd.to_numeric(mappings_df['per_person_amount'], errors='coerce').fillna(0)
-
-        # Add fee calculation columns to pivot table
-        pivot_df['Total Fees per Person'] = 0.0
-        pivot_df['Total Fee Revenue'] = 0.0
-        pivot_df['Tour Revenue (Net of Fees)'] = 0.0
-        pivot_df['Fee Details'] = ""
-
-        # Process each tour
-        for idx, row in pivot_df.iterrows():
-            tour_name = row['Tour Name']
-            total_guests = row.get('Total Guests', 0)
-            subtotal = row.get('Subtotal (Ex-Tax)', row.get('Total Revenue', 0))
-
-            # Find fees for this tour
-            tour_fees = mappings_df[mappings_df['tour_name'] == tour_name]
-
-            if not tour_fees.empty:
-                # Calculate total fees per person
-                total_fees_per_person = tour_fees['per_person_amount'].sum()
-                total_fee_revenue = total_fees_per_person * total_guests
-                tour_revenue_net = subtotal - total_fee_revenue
-
-                # Create fee details string
-                fee_details = []
-                for _, fee_row in tour_fees.iterrows():
-                    fee_amount = fee_row['per_person_amount'] * total_guests
-                    if fee_amount > 0:
-                        fee_details.append(f"{fee_row['fee_name']}: ${fee_amount:.2f}")
+        # Per-tour fee totals
+        fees_per_person = mappings_df.groupby('tour_name', sort=False)['per_person_amount'].sum().reindex(pivot_df['Tour Name'])
+        has_fees = fees_per_person.notna().to_numpy()
 
-                # Update pivot table
-                pivot_df.loc[idx, 'Total Fees per Person'] = total_fees_per_person
-                pivot_df.loc[idx, 'Total Fee Revenue'] = total_fee_revenue
-                pivot_df.loc[idx, 'Tour Revenue (Net of Fees)'] = max(0, tour_revenue_net)
-                pivot_df.loc[idx, 'Fee Details'] = "; ".join(fee_details) if fee_details else "No fees"
-            else:
-                # No fees mapped for this tour
-                pivot_df.loc[idx, 'Tour Revenue (Net of Fees)'] = subtotal
-                pivot_df.loc[idx, 'Fee Details'] = "No fees mapped"
+        if 'Total Guests' in pivot_df.columns:
+            total_guests = pivot_df['Total Guests'].to_numpy()
+        else:
+            total_guests = np.zeros(len(pivot_df))
+        if 'Subtotal (Ex-Tax)' in pivot_df.columns:
+            subtotal = pivot_df['Subtotal (Ex-Tax)'].to_numpy()
+        elif 'Total Revenue' in pivot_df.columns:
+            subtotal = pivot_df['Total Revenue'].to_numpy()
+        else:
+            subtotal = np.zeros(len(pivot_df))
+
+        # Fee calculation columns; tours without mapped fees keep their full subtotal
+        total_fees_per_person = fees_per_person.fillna(0).to_numpy()
+        total_fee_revenue = total_fees_per_person * total_guests
+        pivot_df['Total Fees per Person'] = total_fees_per_person
+        pivot_df['Total Fee Revenue'] = total_fee_revenue
+        # fmax clamps a NaN net revenue to 0, as max(0, x) did per row
+        pivot_df['Tour Revenue (Net of Fees)'] = np.where(
+            has_fees, np.fmax(subtotal - total_fee_revenue, 0), subtotal
+        )
+
+        # Fee details string, e.g. "Park fee: $50.00; Eco: $25.00", built per (tour, fee) and joined per tour
+        guests_by_tour = pd.Series(total_guests, index=pivot_df['Tour Name'].to_numpy())
+        fee_amounts = mappings_df['per_person_amount'] * mappings_df['tour_name'].map(guests_by_tour)
+        charged = fee_amounts > 0
+        # (astype(str) keeps the concatenation valid when no fee is charged and the slice is empty)
+        fee_lines = mappings_df.loc[charged, 'fee_name'].astype(str) + ': $' + fee_amounts[charged].map('{:.2f}'.format).astype(str)
+        fee_details = fee_lines.groupby(mappings_df.loc[charged, 'tour_name'], sort=False).agg('; '.join)
+        pivot_df['Fee Details'] = np.where(
+            has_fees, fee_details.reindex(pivot_df['Tour Name']).fillna("No fees").to_numpy(), "No fees mapped"
+        )
 
         return pivot_df
 
@@ -0,0 +1,35 @@
+"""
+Shared fixtures for the calculation tests
+"""
+
+import os
+import sys
+
+import pytest
+
+# Add the project directory to Python path to import our modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import scripts.journal_exports as journal_exports
+
+TOUR_FEES = [
+    ("Tour A", "Park fee", 5.0),
+    ("Tour A", "Eco", 2.5),
+    ("Tour C", "Park fee", 3.0),
+]
+
+
+@pytest.fixture
+def tour_fees(monkeypatch):
+    """Serve a copy of TOUR_FEES as the tour/fee mapping query result, with no QuickBooks mappings (fallback accounts)"""
+    fees = list(TOUR_FEES)
+
+    def fake_query(query, params=None):
+        if 'tour_fees' in query:
+            return fees
+        return None
+
+    monkeypatch.setattr(journal_exports, 'execute_query', fake_query)
+    journal_exports.get_tour_fee_mappings.clear()
+    yield fees
+    journal_exports.get_tour_fee_mappings.clear()
@@ -0,0 +1,40 @@
+"""
+Tests for the cached pivot, which is keyed on the tour/fee mappings version
+"""
+
+import pandas as pd
+
+from scripts.journal_exports import bump_mappings_version, get_mappings_version
+from views.sales_analysis_view import _cached_tour_pivot_table
+
+
+def make_sales():
+    return pd.DataFrame({
+        'Item': ['Tour A', 'Tour B', 'Tour B'],
+        'Payment Type': ['Credit Card', 'Cash', 'Credit Card'],
+        'Payment or Refund': ['Payment', 'Payment', 'Payment'],
+        'Subtotal': [100.0, 80.0, 40.0],
+        'Subtotal Paid': [100.0, 80.0, 40.0],
+        'Tax Paid': [13.5, 10.8, 5.4],
+        'Total': [113.5, 90.8, 45.4],
+        'Total Paid': [113.5, 90.8, 45.4],
+        '# of Pax': [2.0, 2.0, 1.0],
+        'Receivable from Affiliate': [0.0] * 3,
+        'Received from Affiliate': [0.0] * 3,
+        'Affiliate': [''] * 3,
+    })
+
+
+def fee_revenue(pivot_df, tour_name):
+    return pivot_df.set_index('Tour Name').loc[tour_name, 'Total Fee Revenue']
+
+
+def test_cached_pivot_is_rebuilt_after_a_mappings_write(tour_fees):
+    df = make_sales()
+    assert fee_revenue(_cached_tour_pivot_table(df, get_mappings_version()), 'Tour B') == 0
+
+    # A new fee for Tour B, saved the way the mapping views do it
+    tour_fees.append(("Tour B", "Park fee", 4.0))
+    bump_mappings_version()
+
+    assert fee_revenue(_cached_tour_pivot_table(df, get_mappings_version()), 'Tour B') == 12.0
@@ -0,0 +1,59 @@
+"""
+Equivalence tests for reading checked tour/fee pairs from the mappings matrix
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from views.tours_fees_view import _checked_mappings
+
+FEES = [(10, "Park fee", 5.0), (11, "Eco", 2.5), (12, "Dock", 1.0)]
+FEE_ID_BY_COLUMN = {f"{fee[1]} (${fee[2]})": fee[0] for fee in FEES}
+
+
+def reference_checked_mappings(matrix_df, fees):
+    """The original iterrows walk over every tour row and fee column"""
+    mappings = set()
+    for _, row in matrix_df.iterrows():
+        tour_id = row["tour_id"]
+        for fee in fees:
+            fee_id, fee_name, fee_amount = fee[0], fee[1], fee[2]
+            if row[f"{fee_name} (${fee_amount})"]:
+                mappings.add((tour_id, fee_id))
+    return mappings
+
+
+def make_matrix(n=12, seed=0):
+    rng = np.random.default_rng(seed)
+    matrix_df = pd.DataFrame({'tour_id': np.arange(1, n + 1), 'tour_name': [f"Tour {i}" for i in range(n)]})
+    for column in FEE_ID_BY_COLUMN:
+        matrix_df[column] = rng.choice([True, False], n)
+    return matrix_df
+
+
+MATRICES = {
+    'mixed': make_matrix(),
+    'nothing checked': make_matrix().assign(**{column: False for column in FEE_ID_BY_COLUMN}),
+    'everything checked': make_matrix().assign(**{column: True for column in FEE_ID_BY_COLUMN}),
+    'empty': make_matrix().iloc[0:0],
+}
+
+
+@pytest.mark.parametrize('case', MATRICES)
+def test_checked_mappings_match_iterrows(case):
+    matrix_df = MATRICES[case]
+
+    assert _checked_mappings(matrix_df, FEE_ID_BY_COLUMN) == reference_checked_mappings(matrix_df, FEES)
+
+
+def test_edited_matrix_diff_gives_added_and_removed_pairs():
+    original = make_matrix()
+    edited = original.copy()
+    edited.loc[0, "Park fee ($5.0)"] = not original.loc[0, "Park fee ($5.0)"]
+
+    old_mappings = _checked_mappings(original, FEE_ID_BY_COLUMN)
+    new_mappings = _checked_mappings(edited, FEE_ID_BY_COLUMN)
+
+    changed = (new_mappings - old_mappings) | (old_mappings - new_mappings)
+    assert changed == {(1, 10)}
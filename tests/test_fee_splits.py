@@ -0,0 +1,88 @@
+"""
+Equivalence tests for the vectorized calculate_fee_splits against the original per-tour loop
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from scripts.journal_exports import calculate_fee_splits
+
+
+def reference_fee_splits(pivot_df, tour_fees):
+    """The original per-tour iterrows implementation of calculate_fee_splits"""
+    mappings_df = pd.DataFrame(tour_fees, columns=['tour_name', 'fee_name', 'per_person_amount'])
+    pivot_df = pivot_df.copy()
+    pivot_df['Total Fees per Person'] = 0.0
+    pivot_df['Total Fee Revenue'] = 0.0
+    pivot_df['Tour Revenue (Net of Fees)'] = 0.0
+    pivot_df['Fee Details'] = ""
+
+    for idx, row in pivot_df.iterrows():
+        total_guests = row.get('Total Guests', 0)
+        subtotal = row.get('Subtotal (Ex-Tax)', row.get('Total Revenue', 0))
+        tour_fees_df = mappings_df[mappings_df['tour_name'] == row['Tour Name']]
+
+        if not tour_fees_df.empty:
+            total_fees_per_person = tour_fees_df['per_person_amount'].sum()
+            total_fee_revenue = total_fees_per_person * total_guests
+            fee_details = []
+            for _, fee_row in tour_fees_df.iterrows():
+                fee_amount = fee_row['per_person_amount'] * total_guests
+                if fee_amount > 0:
+                    fee_details.append(f"{fee_row['fee_name']}: ${fee_amount:.2f}")
+
+            pivot_df.loc[idx, 'Total Fees per Person'] = total_fees_per_person
+            pivot_df.loc[idx, 'Total Fee Revenue'] = total_fee_revenue
+            pivot_df.loc[idx, 'Tour Revenue (Net of Fees)'] = max(0, subtotal - total_fee_revenue)
+            pivot_df.loc[idx, 'Fee Details'] = "; ".join(fee_details) if fee_details else "No fees"
+        else:
+            pivot_df.loc[idx, 'Tour Revenue (Net of Fees)'] = subtotal
+            pivot_df.loc[idx, 'Fee Details'] = "No fees mapped"
+
+    return pivot_df
+
+
+FEE_SPLIT_PIVOTS = {
+    'mapped and unmapped tours': pd.DataFrame({
+        'Tour Name': ['Tour A', 'Tour B', 'Tour C'],
+        'Total Guests': [4.0, 2.0, 3.0],
+        'Subtotal (Ex-Tax)': [200.0, 80.0, 5.0],  # Tour C's fees exceed its subtotal
+    }),
+    'NaN guests and subtotals': pd.DataFrame({
+        'Tour Name': ['Tour A', 'Tour B', 'Tour C'],
+        'Total Guests': [np.nan, 2.0, 3.0],
+        'Subtotal (Ex-Tax)': [200.0, np.nan, np.nan],
+    }),
+    'zero guests': pd.DataFrame({
+        'Tour Name': ['Tour A'],
+        'Total Guests': [0.0],
+        'Subtotal (Ex-Tax)': [50.0],
+    }),
+    'Total Revenue fallback': pd.DataFrame({
+        'Tour Name': ['Tour A', 'Tour B'],
+        'Total Guests': [2.0, 1.0],
+        'Total Revenue': [100.0, 40.0],
+    }),
+    # No fee line is charged in the next two, so the fee details join has nothing to format
+    'no mapped tours': pd.DataFrame({
+        'Tour Name': ['Tour B'],
+        'Total Guests': [2.0],
+        'Subtotal (Ex-Tax)': [50.0],
+    }),
+    'empty': pd.DataFrame({
+        'Tour Name': pd.Series(dtype=str),
+        'Total Guests': pd.Series(dtype=float),
+        'Subtotal (Ex-Tax)': pd.Series(dtype=float),
+    }),
+}
+
+
+@pytest.mark.parametrize('case', FEE_SPLIT_PIVOTS)
+def test_fee_splits_match_reference(tour_fees, case):
+    pivot_df = FEE_SPLIT_PIVOTS[case]
+
+    expected = reference_fee_splits(pivot_df, tour_fees)
+    result = calculate_fee_splits(pivot_df.copy())
+
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False)
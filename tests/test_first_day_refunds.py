@@ -0,0 +1,95 @@
+"""
+Tests for the first-day credit card refund adjustment in the sales analysis view
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from views.sales_analysis_view import calculate_first_day_credit_card_refunds
+
+
+def reference_first_day_refunds(df):
+    """The original copy-and-filter implementation of calculate_first_day_credit_card_refunds"""
+    if df.empty:
+        return 0.0
+    df_copy = df.copy()
+    df_copy['Created At Date'] = pd.to_datetime(df_copy['Created At Date'], errors='coerce')
+    first_date = df_copy['Created At Date'].min()
+    if pd.isna(first_date):
+        return 0.0
+
+    first_day_refunds = df_copy[
+        (df_copy['Created At Date'].dt.date == first_date.date()) &
+        (df_copy['Payment or Refund'] == 'Refund') &
+        (df_copy['Payment Type'].str.lower().str.contains('credit', na=False)) &
+        (~df_copy['Payment Type'].str.lower().str.contains('gift', na=False))
+    ]
+    refund_net_col = first_day_refunds['Refund Net'].astype(str).str.replace('$', '').str.replace(',', '').str.replace('"', '')
+    return abs(pd.to_numeric(refund_net_col, errors='coerce').fillna(0).sum())
+
+
+def _refunds(dates):
+    return pd.DataFrame({
+        'Created At Date': dates,
+        'Payment or Refund': ['Refund'] * len(dates),
+        'Payment Type': ['Credit Card'] * len(dates),
+        'Refund Net': [-10.0, -5.0, -1.0][:len(dates)],
+    })
+
+
+def make_report():
+    return pd.DataFrame({
+        'Created At Date': ['2025-07-25 09:00', '2025-07-25 17:30', '2025-07-25 12:00', '2025-07-25 08:00',
+                            '2025-07-26 10:00', '2025-07-25 11:00', '2025-07-25 13:00', '2025-07-27 09:00'],
+        'Payment or Refund': ['Refund', 'Refund', 'Payment', 'Refund', 'Refund', 'Refund', 'Refund', 'Refund'],
+        'Payment Type': ['Credit Card', 'VISA CREDIT', 'Credit Card', 'Credit Gift Card',
+                         'Credit Card', 'Cash', None, 'Credit Card'],
+        'Refund Net': [-12.0, -30.5, 0.0, -9.0, -40.0, -7.0, -3.0, -2.0],
+    })
+
+
+def with_text_amounts(df):
+    df = df.copy()
+    df['Refund Net'] = ['$-12.00', '$-1,030.50', '0', '$-9.00', '$-40.00', '-7', 'n/a', '$-2.00']
+    return df
+
+
+def with_missing_dates(df):
+    df = df.copy()
+    df.loc[[0, 4], 'Created At Date'] = np.nan
+    return df
+
+
+REPORTS = {
+    'report': make_report(),
+    'text amounts': with_text_amounts(make_report()),
+    'missing dates': with_missing_dates(make_report()),
+    'parsed dates': make_report().assign(**{'Created At Date': pd.to_datetime(make_report()['Created At Date'])}),
+    'tz-aware dates': make_report().assign(
+        **{'Created At Date': pd.to_datetime(make_report()['Created At Date']).dt.tz_localize('America/Vancouver')}
+    ),
+    'no dates': make_report().assign(**{'Created At Date': np.nan}),
+    'empty': make_report().iloc[0:0],
+}
+
+
+@pytest.mark.parametrize('case', REPORTS)
+def test_first_day_refunds_match_reference(case):
+    df = REPORTS[case]
+
+    assert calculate_first_day_credit_card_refunds(df) == pytest.approx(reference_first_day_refunds(df))
+
+
+def test_tz_aware_dates_use_the_local_day():
+    # 20:00 and 23:00 on Jan 1 in Vancouver are already Jan 2 in UTC, but still the first local day
+    dates = pd.to_datetime(['2024-01-01 20:00', '2024-01-01 23:00', '2024-01-02 01:00'])
+    df = _refunds(dates.tz_localize('America/Vancouver'))
+
+    assert calculate_first_day_credit_card_refunds(df) == 15.0
+
+
+def test_missing_columns_mean_no_adjustment():
+    df = make_report().drop(columns=['Refund Net'])
+
+    assert calculate_first_day_credit_card_refunds(df) == 0.0
@@ -0,0 +1,75 @@
+"""
+Equivalence tests for the one-pass per-tour grouping behind the payment/affiliate breakdown
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from views.sales_analysis_view import ITEM_SUMMARY_MONEY_COLUMNS, _item_summary
+
+
+def reference_item_summary(df, is_affiliate, is_refund=None):
+    """The original filter-then-groupby per slice"""
+    mask = df['Payment Type'].str.lower().str.contains('affiliate', na=False) == is_affiliate
+    if is_refund is not None:
+        if 'Payment or Refund' in df.columns:
+            mask &= (df['Payment or Refund'] == 'Refund') == is_refund
+        else:
+            mask &= not is_refund
+    sliced = df[mask]
+
+    columns = [col for col in ITEM_SUMMARY_MONEY_COLUMNS + ['# of Pax'] if col in df.columns]
+    summary = sliced.groupby('Item')[columns].sum()
+    summary['Row Count'] = sliced.groupby('Item').size()
+    return summary.reset_index()
+
+
+def make_sales(n=60, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'Item': rng.choice(['Tour A', 'Tour B', 'Tour C'], n),
+        'Payment Type': rng.choice(np.array(['Credit Card', 'Affiliate Invoice', 'AFFILIATE', 'Cash'], dtype=object), n),
+        'Payment or Refund': rng.choice(['Payment', 'Refund'], n, p=[0.7, 0.3]),
+        'Subtotal': rng.integers(-5000, 50000, n) / 100,
+        'Total': rng.integers(-6000, 60000, n) / 100,
+        'Total Paid': rng.integers(0, 60000, n) / 100,
+        'Receivable from Affiliate': rng.choice([0.0, 12.5], n),
+        'Received from Affiliate': rng.choice([0.0, 7.25], n),
+        '# of Pax': rng.integers(1, 6, n).astype(float),
+    })
+
+
+def with_gaps(df):
+    """Missing tours, payment types and amounts, as a raw report can have"""
+    df = df.copy()
+    df.loc[[1, 7], 'Item'] = np.nan
+    df.loc[[2, 9], 'Payment Type'] = np.nan
+    df.loc[[3, 11], 'Subtotal'] = np.nan
+    df.loc[[4], '# of Pax'] = np.nan
+    return df
+
+
+SALES = {
+    'report': make_sales(),
+    'NaN values': with_gaps(make_sales(seed=1)),
+    'no Payment or Refund column': make_sales(seed=2).drop(columns=['Payment or Refund']),
+}
+SLICES = [(True, None), (False, None), (False, True), (True, False)]
+
+
+@pytest.mark.parametrize('case', SALES)
+@pytest.mark.parametrize('is_affiliate, is_refund', SLICES)
+def test_item_summary_matches_filter_and_groupby(case, is_affiliate, is_refund):
+    df = SALES[case]
+
+    expected = reference_item_summary(df, is_affiliate, is_refund)
+    result = _item_summary(df, is_affiliate=is_affiliate, is_refund=is_refund)
+
+    pd.testing.assert_frame_equal(result[expected.columns], expected, check_dtype=False, check_index_type=False)
+
+
+def test_item_summary_of_empty_report_is_empty():
+    df = make_sales().iloc[0:0]
+
+    assert _item_summary(df, is_affiliate=False).empty
@@ -0,0 +1,33 @@
+"""
+Equivalence tests for the column-wise calculate_proportional_fees_streamlit.
+
+calculate_proportional_fees_v2 keeps the original scalar formula, so it serves as the reference.
+"""
+
+import numpy as np
+import pandas as pd
+
+from scripts.journal_exports import calculate_proportional_fees_v2
+from views.sales_analysis_view import calculate_proportional_fees_streamlit
+
+
+def test_proportional_fees_match_scalar_reference():
+    subtotal_paid = np.array([50.0, -50.0, 150.0, 20.0, 0.0, np.nan, 30.0, 10.0, 25.0])
+    subtotal_total = np.array([100.0, 100.0, 100.0, 0.0, 100.0, 100.0, np.nan, -40.0, 0.0])
+    total_fees = np.array([10.0, 10.0, 10.0, 10.0, 10.0, 10.0, 10.0, 10.0, np.nan])
+
+    expected = [
+        calculate_proportional_fees_v2(paid, total, fees)
+        for paid, total, fees in zip(subtotal_paid, subtotal_total, total_fees)
+    ]
+    result = calculate_proportional_fees_streamlit(subtotal_paid, subtotal_total, total_fees)
+
+    np.testing.assert_allclose(result, expected, equal_nan=True)
+
+
+def test_proportional_fees_accept_series_and_empty_columns():
+    result = calculate_proportional_fees_streamlit(pd.Series([25.0]), pd.Series([100.0]), pd.Series([8.0]))
+    np.testing.assert_allclose(result, [2.0])
+
+    empty = pd.Series(dtype=float)
+    assert len(calculate_proportional_fees_streamlit(empty, empty, empty)) == 0
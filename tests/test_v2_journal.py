@@ -0,0 +1,113 @@
+"""
+Equivalence tests for the V2 QuickBooks journal booking loops (coerced columns, itertuples).
+
+The expected lines were produced by the original iterrows implementation from the same sales rows.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from scripts.journal_exports import create_enhanced_quickbooks_journal_v2, create_tour_pivot_table
+
+
+def make_sales():
+    return pd.DataFrame({
+        'Item': ['Tour A', 'Tour A', 'Tour B', 'Tour C', 'Tour A', 'Tour C', 'Tour B'],
+        'Payment Type': ['Credit Card', 'Cash', 'Credit Card', 'Visa Card', 'Credit Card', 'Cash', 'Gift Card'],
+        'Payment or Refund': ['Payment', 'Payment', 'Payment', 'Payment', 'Refund', 'Refund', 'Payment'],
+        'Subtotal': [100.0, 200.0, 80.0, 60.0, 100.0, 60.0, 40.0],
+        'Subtotal Paid': [100.0, 150.0, 80.0, 0.0, -50.0, -60.0, 40.0],
+        'Tax Paid': [13.5, 20.25, 10.8, 8.1, -6.75, -8.1, 0.0],
+        'Total': [113.5, 270.0, 90.8, 68.1, 113.5, 68.1, 45.4],
+        'Total Paid': [113.5, 170.25, 90.8, 68.1, -56.75, -68.1, 40.0],
+        '# of Pax': [2.0, 4.0, 1.0, 0.0, 2.0, 3.0, 1.0],
+        'Processing Fee': [-3.3, 0.0, -2.6, -2.0, 1.6, 0.0, 0.0],
+        'Receivable from Affiliate': [0.0] * 7,
+        'Received from Affiliate': [0.0] * 7,
+        'Affiliate': [''] * 7,
+    })
+
+
+REVENUE_LINES = [
+    ('Tour Revenue - Tour A', '', '212.50'),
+    ('Tour Revenue - Tour B', '', '120.00'),
+    ('Tour Revenue - Tour A', '42.50', ''),
+    ('Tour Revenue - Tour C', '51.00', ''),
+    ('Fee Revenue - Park fee', '', '25.00'),
+    ('Fee Revenue - Eco', '', '12.50'),
+    ('Fee Revenue - Park fee', '14.00', ''),
+    ('Fee Revenue - Eco', '2.50', ''),
+    ('Sales Tax Payable', '', '52.65'),
+    ('Sales Tax Payable', '14.85', ''),
+]
+PROCESSING_FEE_LINES = [
+    ('Processing Fee Expense', '4.30', ''),
+    ('Credit Card Clearing', '', '4.30'),
+    ('Processing Fee Expense', '2.00', ''),
+    ('Credit Card Clearing', '', '2.00'),
+]
+PAYMENT_LINES = [
+    ('Credit Card Clearing', '147.55', ''),
+    ('Cash - Operating', '102.15', ''),
+    ('Gift Card Liability', '40.00', ''),
+    ('Credit Card Clearing', '8.10', ''),
+]
+
+PAYMENTS_BY_TYPE = {'Credit Card': 147.55, 'Cash': 102.15, 'Gift Card': 40.0, 'Visa Card': 8.1}
+PROCESSING_FEES_BY_TYPE = {'Credit Card': -4.3, 'Visa Card': -2.0}
+
+
+def journal_lines(journal_df):
+    return list(journal_df[['Account', 'Debit', 'Credit']].itertuples(index=False, name=None))
+
+
+@pytest.mark.parametrize('include_processing_fees', [False, True])
+def test_v2_journal_matches_original_lines(tour_fees, include_processing_fees):
+    df = make_sales()
+
+    journal_df, vat_payments, vat_refunds = (
+        create_enhanced_quickbooks_journal_v2(create_tour_pivot_table(df), df, include_processing_fees)[:3]
+    )
+
+    expected_lines = REVENUE_LINES + (PROCESSING_FEE_LINES if include_processing_fees else []) + PAYMENT_LINES
+    assert journal_lines(journal_df) == expected_lines
+    assert vat_payments == pytest.approx(52.65)
+    assert vat_refunds == pytest.approx(14.85)
+
+
+@pytest.mark.parametrize('include_processing_fees', [False, True])
+def test_v2_payment_totals_by_type_match_original(tour_fees, include_processing_fees):
+    df = make_sales()
+
+    payments_by_type, processing_fees_by_type = (
+        create_enhanced_quickbooks_journal_v2(create_tour_pivot_table(df), df, include_processing_fees)[3:5]
+    )
+
+    # Same totals, and the same key order the journal lines follow
+    assert list(payments_by_type) == list(PAYMENTS_BY_TYPE)
+    assert payments_by_type == pytest.approx(PAYMENTS_BY_TYPE)
+    assert processing_fees_by_type == pytest.approx(PROCESSING_FEES_BY_TYPE if include_processing_fees else {})
+
+
+def test_v2_journal_counts_missing_amounts_as_zero(tour_fees):
+    df = make_sales()
+    with_gaps = df.copy()
+    with_gaps.loc[3, ['Subtotal Paid', '# of Pax']] = np.nan
+    with_gaps.loc[6, 'Tax Paid'] = np.nan
+
+    expected = create_enhanced_quickbooks_journal_v2(create_tour_pivot_table(df), df, True)
+    result = create_enhanced_quickbooks_journal_v2(create_tour_pivot_table(with_gaps), with_gaps, True)
+
+    assert journal_lines(result[0]) == journal_lines(expected[0])
+
+
+def test_v2_journal_of_empty_report_is_empty(tour_fees):
+    df = make_sales().iloc[0:0]
+
+    journal_df, vat_payments, vat_refunds, payments_by_type, processing_fees_by_type, _ = (
+        create_enhanced_quickbooks_journal_v2(create_tour_pivot_table(df), df, True)
+    )
+
+    assert journal_df.empty
+    assert (vat_payments, vat_refunds, payments_by_type, processing_fees_by_type) == (0, 0, {}, {})
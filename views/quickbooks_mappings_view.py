@@ -3,6 +3,7 @@ import streamlit as st
 import pandas as pd
 from scripts.database import execute_query
 from scripts.data_loaders import load_sales_csv_data
+from scripts.journal_exports import bump_mappings_version
 
 # Import requests for API calls
 try:
@@ -1652,6 +1653,10 @@ ON CONFLICT (mapping_type, fareharbour_item) DO UPDATE SET
                 st.code(f"Full error after {total_time:.2f}s: {str(e)}")
         return False
 
+    finally:
+        # Journals cached from the previous mappings must be rebuilt, even after a partial save
+        bump_mappings_version()
+
 def show_mapping_summary():
     """Show summary of current mappings"""
     if not st.session_state.qb_mappings_data:
@@ -1,85 +1,186 @@
 # Sales Report Analysis View
 import streamlit as st
 import pandas as pd
+import numpy as np
 import requests
+import io
+import re
+import hashlib
 from datetime import datetime
 from scripts.data_loaders import load_sales_csv_data
-from scripts.database import execute_query
 from scripts.journal_exports import (
     create_enhanced_quickbooks_journal_v2,
     create_enhanced_quickbooks_journal_api_v2,
     create_v2_detailed_records,
     create_tour_pivot_table,
-    get_quickbooks_mappings
+    get_quickbooks_mappings,
+    get_tour_fee_mappings,
+    get_mappings_version
 )
 
-def generate_v2_export(df, pivot_data, include_processing_fees=False):
-    """Generate V2 export excluding affiliate bookings where payment already received"""
-    st.markdown("---")
-    st.subheader("🎯 V2 Export Results (Filtered Bookings)")
+# The pivot and journals read tour fees and QuickBooks mappings from the database, so these
+# caches are also keyed on the mappings version (bumped whenever that config is written)
+@st.cache_data(show_spinner=False, ttl="10m", max_entries=32)
+def _cached_tour_pivot_table(df, mappings_version):
+    """Cached create_tour_pivot_table so reruns with unchanged data and mappings skip the rebuild"""
+    return create_tour_pivot_table(df)
+
+@st.cache_data(show_spinner=False, ttl="10m", max_entries=32)
+def _cached_quickbooks_journal_v2(pivot_df, raw_df, include_processing_fees, mappings_version):
+    """Cached create_enhanced_quickbooks_journal_v2 keyed on the pivot, raw data, fee flag and mappings version"""
+    return create_enhanced_quickbooks_journal_v2(pivot_df, raw_df, include_processing_fees)
+
+@st.cache_data(show_spinner=False, ttl="10m", max_entries=32)
+def _cached_v2_detailed_records(v2_filtered_df, mappings_version):
+    """Cached create_v2_detailed_records keyed on the V2-filtered data and mappings version"""
+    return create_v2_detailed_records(v2_filtered_df)
+
+@st.cache_data(show_spinner=False, ttl="10m", max_entries=32)
+def _csv_bytes(df):
+    """Serialize a DataFrame to UTF-8 CSV bytes once per distinct frame"""
+    return df.to_csv(index=False).encode('utf-8')
+
+def _frame_digest(df):
+    """SHA-1 of the full per-row hash array, so any changed, added or reordered row changes it"""
+    return hashlib.sha1(pd.util.hash_pandas_object(df, index=False).values.tobytes()).hexdigest()
+
+def _page_rows(df, key):
+    """Return the page of df picked with a rows-per-page selector, so only those rows reach the browser"""
+    page_size = st.selectbox("Rows per page", [100, 500, 2000, "All"], index=1, key=f"{key}_page_size")
+    if page_size == "All" or len(df) <= page_size:
+        return df
+
+    page_count = -(-len(df) // page_size)
+    # The page input is driven by its key alone; pull it back in range when the page count shrinks
+    if st.session_state.get(f"{key}_page", 1) > page_count:
+        st.session_state[f"{key}_page"] = 1
+    page = st.number_input("Page", min_value=1, max_value=page_count, step=1, key=f"{key}_page")
+    st.caption(f"Showing rows {(page - 1) * page_size + 1:,}–{min(page * page_size, len(df)):,} of {len(df):,}")
+    return df.iloc[(page - 1) * page_size:page * page_size]
+
+def _build_v2_results(df, include_processing_fees):
+    """Run the V2 filter, pivot, journals and detailed records; stores the CSV bytes in session state"""
+    results = {
+        'filtered': pd.DataFrame(),
+        'pivot': pd.DataFrame(),
+        'journal': pd.DataFrame(),
+        'detailed': pd.DataFrame(),
+        'api_entries': [],
+    }
 
-    # Filter out bookings where affiliate payment already received
-    v2_raw_df = df.copy()
-    v2_raw_df['Receivable from Affiliate'] = pd.to_numeric(v2_raw_df.get('Receivable from Affiliate', 0), errors='coerce').fillna(0)
-    v2_raw_df['Received from Affiliate'] = pd.to_numeric(v2_raw_df.get('Received from Affiliate', 0), errors='coerce').fillna(0)
+    # Remove bookings where affiliate payment already received; the affiliate columns are
+    # numeric from load_sales_csv_data, and the result is a plain slice (downstream only reads it)
+    affiliate_paid = (df['Receivable from Affiliate'] > 0) | (df['Received from Affiliate'] > 0)
+    v2_filtered_df = df.loc[~affiliate_paid]
+    results['filtered'] = v2_filtered_df
 
-    # Remove bookings where affiliate payment already received
-    v2_filtered_df = v2_raw_df[
-        ~((v2_raw_df['Receivable from Affiliate'] > 0) | (v2_raw_df['Received from Affiliate'] > 0))
-    ].copy()
+    if v2_filtered_df.empty:
+        return results
 
-    if not v2_filtered_df.empty:
-        # Recalculate pivot table for V2
-        v2_pivot_df = create_tour_pivot_table(v2_filtered_df)
+    # Recalculate pivot table for V2
+    v2_pivot_df = _cached_tour_pivot_table(v2_filtered_df, get_mappings_version())
+    results['pivot'] = v2_pivot_df
 
-        if not v2_pivot_df.empty:
+    if v2_pivot_df.empty:
+        return results
+
+    # Generate V2 journal and detailed records
+    v2_journal_df, total_vat_payments, total_vat_refunds, v2_payment_type_totals, v2_processing_fees_totals, v2_net_payment_totals = _cached_quickbooks_journal_v2(v2_pivot_df, v2_filtered_df, include_processing_fees, get_mappings_version())
+    results['journal'] = v2_journal_df
+
+    # Generate API JSON for debugging
+    v2_api_journal_entries, api_vat_payments, api_vat_refunds, api_payment_totals, api_processing_fees, api_net_payments, api_rounding_adjustment = create_enhanced_quickbooks_journal_api_v2(v2_pivot_df, v2_filtered_df, include_processing_fees)
+
+    # Check if API journal is balanced
+    api_balance_status = "❌ Unbalanced"
+    api_balance_details = ""
+
+    if v2_api_journal_entries:
+        journal_entry = v2_api_journal_entries[0]
+        total_debits = 0
+        total_credits = 0
+
+        for line in journal_entry.get('Line', []):
+            amount = float(line.get('Amount', 0))
+            posting_type = line.get('JournalEntryLineDetail', {}).get('PostingType', '')
 
-            # Generate V2 journal and detailed records
-            v2_journal_df, total_vat_payments, total_vat_refunds, v2_payment_type_totals, v2_processing_fees_totals, v2_net_payment_totals = create_enhanced_quickbooks_journal_v2(v2_pivot_df, v2_filtered_df, include_processing_fees)
+            if posting_type == 'Debit':
+                total_debits += amount
+            elif posting_type == 'Credit':
+                total_credits += amount
 
-            # Generate API JSON for debugging
-            v2_api_journal_entries, api_vat_payments, api_vat_refunds, api_payment_totals, api_processing_fees, api_net_payments, api_rounding_adjustment = create_enhanced_quickbooks_journal_api_v2(v2_pivot_df, v2_filtered_df, include_processing_fees)
+        difference = total_debits - total_credits
 
-            # Check if API journal is balanced
+        if abs(difference) <= 0.01:
+            api_balance_status = "✅ Balanced"
+            api_balance_details = f"Debits: ${total_debits:.2f}, Credits: ${total_credits:.2f}"
+        else:
             api_balance_status = "❌ Unbalanced"
-            api_balance_details = ""
+            api_balance_details = f"Debits: ${total_debits:.2f}, Credits: ${total_credits:.2f}, Difference: ${difference:.2f}"
+
+    results.update({
+        'api_entries': v2_api_journal_entries,
+        'api_vat_payments': api_vat_payments,
+        'api_vat_refunds': api_vat_refunds,
+        'api_payment_totals': api_payment_totals,
+        'api_rounding_adjustment': api_rounding_adjustment,
+        'api_balance_status': api_balance_status,
+        'api_balance_details': api_balance_details,
+    })
+
+    if not v2_journal_df.empty:
+        # Generate detailed records
+        v2_detailed_records = _cached_v2_detailed_records(v2_filtered_df, get_mappings_version())
+        results['detailed'] = v2_detailed_records
+
+        # Store CSV data in session state (cached, so unchanged frames are not re-serialized)
+        st.session_state.v2_pivot_csv = _csv_bytes(v2_pivot_df)
+        st.session_state.v2_filtered_csv = _csv_bytes(v2_filtered_df)
+        st.session_state.v2_journal_csv = _csv_bytes(v2_journal_df)
+        st.session_state.v2_detailed_csv = _csv_bytes(v2_detailed_records)
+        st.session_state.v2_payment_type_totals = v2_payment_type_totals
+        st.session_state.v2_processing_fees_totals = v2_processing_fees_totals
+        st.session_state.v2_net_payment_totals = v2_net_payment_totals
+
+    return results
 
-            if v2_api_journal_entries:
-                journal_entry = v2_api_journal_entries[0]
-                total_debits = 0
-                total_credits = 0
+def generate_v2_export(df, pivot_data, include_processing_fees=False):
+    """Generate V2 export excluding affiliate bookings where payment already received"""
+    st.markdown("---")
+    st.subheader("🎯 V2 Export Results (Filtered Bookings)")
 
-                for line in journal_entry.get('Line', []):
-                    amount = float(line.get('Amount', 0))
-                    posting_type = line.get('JournalEntryLineDetail', {}).get('PostingType', '')
+    # Only regenerate when the data, fee option or mappings changed since the last run
+    sig = (
+        _frame_digest(df),
+        tuple(df.columns),
+        include_processing_fees,
+        get_mappings_version()
+    )
+    if st.session_state.get('v2_sig') != sig or 'v2_results' not in st.session_state:
+        st.session_state.v2_results = _build_v2_results(df, include_processing_fees)
+        st.session_state.v2_sig = sig
+        st.session_state.v2_ts = datetime.now().strftime('%Y%m%d_%H%M%S')
 
-                    if posting_type == 'Debit':
-                        total_debits += amount
-                    elif posting_type == 'Credit':
-                        total_credits += amount
+    # One timestamp per generation so download file names stay stable across reruns
+    ts = st.session_state.v2_ts
 
-                difference = total_debits - total_credits
+    results = st.session_state.v2_results
+    v2_filtered_df = results['filtered']
+    v2_pivot_df = results['pivot']
+    v2_journal_df = results['journal']
+    v2_detailed_records = results['detailed']
+    v2_api_journal_entries = results['api_entries']
 
-                if abs(difference) <= 0.01:
-                    api_balance_status = "✅ Balanced"
-                    api_balance_details = f"Debits: ${total_debits:.2f}, Credits: ${total_credits:.2f}"
-                else:
-                    api_balance_status = "❌ Unbalanced"
-                    api_balance_details = f"Debits: ${total_debits:.2f}, Credits: ${total_credits:.2f}, Difference: ${difference:.2f}"
+    if not v2_filtered_df.empty:
+        if not v2_pivot_df.empty:
+            api_vat_payments = results['api_vat_payments']
+            api_vat_refunds = results['api_vat_refunds']
+            api_payment_totals = results['api_payment_totals']
+            api_rounding_adjustment = results['api_rounding_adjustment']
+            api_balance_status = results['api_balance_status']
+            api_balance_details = results['api_balance_details']
 
             if not v2_journal_df.empty:
-                # Generate detailed records
-                v2_detailed_records = create_v2_detailed_records(v2_filtered_df)
-
-                # Store CSV data in session state
-                st.session_state.v2_pivot_csv = v2_pivot_df.to_csv(index=False)
-                st.session_state.v2_filtered_csv = v2_filtered_df.to_csv(index=False)
-                st.session_state.v2_journal_csv = v2_journal_df.to_csv(index=False)
-                st.session_state.v2_detailed_csv = v2_detailed_records.to_csv(index=False)
-                st.session_state.v2_payment_type_totals = v2_payment_type_totals
-                st.session_state.v2_processing_fees_totals = v2_processing_fees_totals
-                st.session_state.v2_net_payment_totals = v2_net_payment_totals
-
                 # Create tabs for exports and previews
                 export_tab, api_debug_tab, downloads_tab = st.tabs(["📚 Journal Export", "🔧 API JSON Debug", "📥 Additional Downloads"])
                 
@@ -91,7 +192,7 @@ def generate_v2_export(df, pivot_data, include_processing_fees=False):
                     st.download_button(
                         label="📚 Download V2 Journal + Details",
                         data=st.session_state.v2_journal_csv,
-                        file_name=f"quickbooks_journal_v2_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+                        file_name=f"quickbooks_journal_v2_{ts}.csv",
                         mime='text/csv',
                         help="Download V2 QuickBooks journal entries with detailed records",
                         use_container_width=True
@@ -176,12 +277,12 @@ def generate_v2_export(df, pivot_data, include_processing_fees=False):
                     # Journal preview - full width with column summations
                     st.markdown("#### 🔍 Journal Preview")
                     
-                    # Calculate column summations
-                    total_credits = pd.to_numeric(v2_journal_df['Credit'].replace('', '0'), errors='coerce').sum()
-                    total_debits = pd.to_numeric(v2_journal_df['Debit'].replace('', '0'), errors='coerce').sum()
+                    # Calculate column summations (blank cells coerce to NaN, which sum() skips)
+                    total_credits = pd.to_numeric(v2_journal_df['Credit'], errors='coerce').sum()
+                    total_debits = pd.to_numeric(v2_journal_df['Debit'], errors='coerce').sum()
                     
-                    # Display the journal with full width
-                    st.dataframe(v2_journal_df, use_container_width=True, height=400)
+                    # Display the journal with full width, one page at a time
+                    st.dataframe(_page_rows(v2_journal_df, "journal_preview"), use_container_width=True, height=400)
                     
                     # Show column summations at bottom
                     sum_col1, sum_col2, sum_col3 = st.columns(3)
@@ -203,7 +304,7 @@ def generate_v2_export(df, pivot_data, include_processing_fees=False):
                         st.download_button(
                             label="📊 Download V2 Pivot Table",
                             data=st.session_state.v2_pivot_csv,
-                            file_name=f"sales_pivot_table_v2_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+                            file_name=f"sales_pivot_table_v2_{ts}.csv",
                             mime='text/csv',
                             help="Download V2 pivot table (excludes affiliate payments received)",
                             use_container_width=True
@@ -213,7 +314,7 @@ def generate_v2_export(df, pivot_data, include_processing_fees=False):
                         st.download_button(
                             label="📋 Download V2 Filtered Data",
                             data=st.session_state.v2_filtered_csv,
-                            file_name=f"sales_filtered_data_v2_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+                            file_name=f"sales_filtered_data_v2_{ts}.csv",
                             mime='text/csv',
                             help="Download V2 filtered raw data",
                             use_container_width=True
@@ -223,7 +324,7 @@ def generate_v2_export(df, pivot_data, include_processing_fees=False):
                         st.download_button(
                             label="📑 Download V2 Detailed Records",
                             data=st.session_state.v2_detailed_csv,
-                            file_name=f"v2_detailed_records_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+                            file_name=f"v2_detailed_records_{ts}.csv",
                             mime='text/csv',
                             help="Download detailed records with fee breakdown and net amounts",
                             use_container_width=True
@@ -231,7 +332,7 @@ def generate_v2_export(df, pivot_data, include_processing_fees=False):
                     
                     # Preview for detailed records
                     with st.expander("📋 Preview V2 Detailed Records"):
-                        preview_df = v2_detailed_records.head(10).copy()
+                        preview_df = v2_detailed_records.head(10)
                         if len(v2_detailed_records) > 10:
                             st.info(f"Showing first 10 of {len(v2_detailed_records)} records")
                         st.dataframe(preview_df, use_container_width=True)
@@ -282,7 +383,7 @@ def generate_v2_export(df, pivot_data, include_processing_fees=False):
                             st.download_button(
                                 label="📥 Download API JSON",
                                 data=json.dumps(v2_api_journal_entries[0], indent=2),
-                                file_name=f"qb_api_journal_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
+                                file_name=f"qb_api_journal_{ts}.json",
                                 mime='application/json',
                                 help="Download the JSON payload for QuickBooks API",
                                 use_container_width=True
@@ -380,6 +481,26 @@ def generate_v2_export(df, pivot_data, include_processing_fees=False):
         st.warning("⚠️ All bookings were excluded by V2 filter (all had affiliate payments already received).")
 
 
+# One entry: a new mtime replaces the previous load instead of keeping every saved version
+@st.cache_data(show_spinner=False, max_entries=1)
+def _load_default_sales_csv(path, mtime):
+    """Load the local default sales report; mtime is part of the cache key so edits are picked up"""
+    with open(path, 'rb') as f:
+        return load_sales_csv_data(f)
+
+@st.cache_data(show_spinner=False, ttl="10m", max_entries=8)
+def _read_payout_csv(data):
+    """Parse an uploaded payout CSV with the multithreaded Arrow reader, cached on the file bytes"""
+    try:
+        payout_df = pd.read_csv(io.BytesIO(data), engine='pyarrow')
+    except pd.errors.ParserError:
+        # The Arrow reader rejects ragged rows the default engine pads with NaN
+        payout_df = pd.read_csv(io.BytesIO(data))
+    # Parse period dates once here rather than on every comparison rerun
+    if 'period_end_date' in payout_df.columns:
+        payout_df['period_end_date'] = pd.to_datetime(payout_df['period_end_date'], errors='coerce')
+    return payout_df
+
 def sales_report_analysis():
     """Sales Report Analysis Page with CSV Upload and Pivot Tables"""
     st.title("📊 Sales Report Analysis")
@@ -410,18 +531,11 @@ def sales_report_analysis():
 
     # Check if default file exists and load it automatically
     import os
-    import io
     if os.path.exists(default_csv_path):
         try:
-            with open(default_csv_path, 'rb') as f:
-                default_csv_content = f.read()
-
-            # Convert bytes to file-like object for pandas
-            csv_file_like = io.BytesIO(default_csv_content)
-
-            # Load the default CSV
+            # Load the default CSV (cached until the file changes on disk)
             with st.spinner("Loading default sales report for development..."):
-                df = load_sales_csv_data(csv_file_like)
+                df = _load_default_sales_csv(default_csv_path, os.path.getmtime(default_csv_path))
                 default_file_loaded = True
 
             st.sidebar.success("✅ Default CSV loaded for development")
@@ -455,7 +569,7 @@ def sales_report_analysis():
     # Store payout data in session state
     if payout_csv_file is not None:
         try:
-            payout_df = pd.read_csv(payout_csv_file)
+            payout_df = _read_payout_csv(payout_csv_file.getvalue())
             st.session_state.payout_df = payout_df
             st.sidebar.success(f"✅ Payout CSV loaded ({len(payout_df)} records)")
         except Exception as e:
@@ -522,12 +636,9 @@ def sales_report_analysis():
 
 def create_sales_pivot_analysis(df):
     """Create pivot table analysis with filtering"""
-    # Use the full dataframe without filtering
-    filtered_df = df.copy()
-
-    # Create pivot table
-    if not filtered_df.empty:
-        pivot_data = create_tour_pivot_table(filtered_df)
+    # Create pivot table from the full dataframe without filtering
+    if not df.empty:
+        pivot_data = _cached_tour_pivot_table(df, get_mappings_version())
 
         if not pivot_data.empty:
 
@@ -553,69 +664,7 @@ def create_sales_pivot_analysis(df):
 
 # Removed duplicate create_tour_pivot_table function - using import from scripts.journal_exports
 
-def calculate_fee_splits(pivot_df):
-    """Calculate tour revenue vs fee revenue splits using database mappings"""
-    try:
-        # Get tour-fee mappings from database
-        mappings = execute_query("""
-            SELECT t.name as tour_name, f.name as fee_name, f.per_person_amount
-            FROM tour_fees tf
-            JOIN tours t ON tf.tour_id = t.id
-            JOIN fees f ON tf.fee_id = f.id
-            ORDER BY t.name, f.name
-        """)
-
-        if not mappings:
-            st.info("💡 No tour-fee mappings found in database. Showing raw revenue data.")
-            return pivot_df
-
-        # Convert mappings to DataFrame for easier processing
-        mappings_df = pd.DataFrame(mappings, columns=['tour_name', 'fee_name', 'per_person_amount'])
-        mappings_df['per_person_amount'] = pd.to_numeric(mappings_df['per_person_amount'], errors='coerce').fillna(0)
-
-        # Add fee calculation columns to pivot table
-        pivot_df['Total Fees per Person'] = 0.0
-        pivot_df['Total Fee Revenue'] = 0.0
-        pivot_df['Tour Revenue (Net of Fees)'] = 0.0
-        pivot_df['Fee Details'] = ""
-
-        # Process each tour
-        for idx, row in pivot_df.iterrows():
-            tour_name = row['Tour Name']
-            total_guests = row.get('Total Guests', 0)
-            subtotal = row.get('Subtotal (Ex-Tax)', row.get('Total Revenue', 0))
-
-            # Find fees for this tour
-            tour_fees = mappings_df[mappings_df['tour_name'] == tour_name]
-
-            if not tour_fees.empty:
-                # Calculate total fees per person
-                total_fees_per_person = tour_fees['per_person_amount'].sum()
-                total_fee_revenue = total_fees_per_person * total_guests
-                tour_revenue_net = subtotal - total_fee_revenue
-
-                # Create fee details string
-                fee_details = []
-                for _, fee_row in tour_fees.iterrows():
-                    fee_amount = fee_row['per_person_amount'] * total_guests
-                    if fee_amount > 0:
-                        fee_details.append(f"{fee_row['fee_name']}: ${fee_amount:.2f}")
-
-                # Update pivot table
-                pivot_df.loc[idx, 'Total Fees per Person'] = total_fees_per_person
-                pivot_df.loc[idx, 'Total Fee Revenue'] = total_fee_revenue
-                pivot_df.loc[idx, 'Tour Revenue (Net of Fees)'] = max(0, tour_revenue_net)
-                pivot_df.loc[idx, 'Fee Details'] = "; ".join(fee_details) if fee_details else "No fees"
-            else:
-                # No fees mapped for this tour
-                pivot_df.loc[idx, 'Tour Revenue (Net of Fees)'] = subtotal
-                pivot_df.loc[idx, 'Fee Details'] = "No fees mapped"
-
-        return pivot_df
-
-    except Exception as e:
-        st.error(f"❌ Error calculating fee splits: {str(e)}")
-        return pivot_df
+# Removed duplicate calculate_fee_splits function - using the one in scripts.journal_exports
 
 # Removed duplicate function - using import from scripts.journal_exports  
 # Removed duplicate get_quickbooks_mappings function - using import from scripts.journal_exports
@@ -651,7 +700,7 @@ def calculate_payment_breakdown(transactions):
 
             for _, row in payment_summary.iterrows():
                 payment_type = row['Payment Type']
-                amount = pd.to_numeric(row['Total Paid'], errors='coerce')
+                amount = row['Total Paid']
                 if amount > 0:
                     payment_breakdown[payment_type] = amount
         else:
@@ -716,164 +765,94 @@ def calculate_payment_type_splits(transactions, tour_revenue, total_fee_revenue)
             'proportions': {'unknown': 1.0}
         }
 
-def get_payment_account(payment_type):
-    """Map payment type to appropriate GL account"""
-    payment_type_lower = payment_type.lower().strip()
-
-    # Map payment types to GL accounts
-    account_mapping = {
-        'credit card': 'Credit Card Clearing',
-        'mastercard': 'Credit Card Clearing',
-        'visa': 'Credit Card Clearing',
-        'amex': 'Credit Card Clearing',
-        'american express': 'Credit Card Clearing',
-        'affiliate': 'Affiliate Receivable',
-        'cash': 'Cash - Operating',
-        'check': 'Undeposited Funds',
-        'cheque': 'Undeposited Funds',
-        'bank transfer': 'Bank Transfer Clearing',
-        'wire transfer': 'Bank Transfer Clearing',
-        'paypal': 'PayPal Clearing',
-        'square': 'Square Clearing',
-        'stripe': 'Stripe Clearing',
-        'gift card': 'Gift Card Liability',
-        'voucher': 'Voucher Clearing',
-        'comp': 'Complimentary Services',
-        'comped': 'Complimentary Services',
-        'refund': 'Refunds Payable'
-    }
-
-    # Check for exact matches first
-    if payment_type_lower in account_mapping:
-        return account_mapping[payment_type_lower]
-
-    # Check for partial matches
-    for key, account in account_mapping.items():
-        if key in payment_type_lower:
-            return account
-
-    # Default fallback
-    return 'Accounts Receivable'
+# Removed duplicate get_payment_account function - using the cached one in scripts.journal_exports
 
 def calculate_proportional_fees_streamlit(subtotal_paid, subtotal_total, total_fees_for_booking):
     """
     Calculate proportional fees based on partial payment - same logic as test script
     Formula: (Subtotal Paid / Subtotal Total) * Total Fees
-    
+
+    Accepts scalars or whole columns (arrays/Series) and works element-wise.
+
     Special cases:
     - If subtotal_total is 0, return 0
     - If payment >= subtotal (overpayment), cap proportion at 1.0 (100% of fees)
     """
-    if subtotal_total == 0:
-        return 0
-    
-    proportion = abs(subtotal_paid) / subtotal_total  # Use abs for refunds
-    
+    subtotal_paid = np.asarray(subtotal_paid, dtype=float)
+    subtotal_total = np.asarray(subtotal_total, dtype=float)
+    has_total = subtotal_total != 0
+
+    proportion = np.abs(subtotal_paid) / np.where(has_total, subtotal_total, 1.0)  # Use abs for refunds
+
     # Cap proportion at 1.0 for overpayment scenarios
-    proportion = min(proportion, 1.0)
-    
-    return proportion * total_fees_for_booking
+    proportion = np.minimum(proportion, 1.0)
+
+    # A zero subtotal is 0 outright, even when the booking's fee total is missing
+    return np.where(has_total, proportion * np.asarray(total_fees_for_booking, dtype=float), 0.0)
 
 
+PAYMENT_REFUND_PIVOT_COLUMN_CONFIG = {
+    "Payment or Refund": st.column_config.TextColumn("Payment or Refund", width="small"),
+    "Item": st.column_config.TextColumn("Item", width="medium"),
+    "SUM of Ex fee sub paid": st.column_config.TextColumn("SUM of Ex fee sub paid", width="medium"),
+    "SUM of Fees": st.column_config.TextColumn("SUM of Fees", width="medium"),
+}
+
 def display_payment_refund_pivot_table(df):
     """Display pivot table with Payment/Refund breakdown by tour matching the requested layout"""
     try:
         # Get fee mappings from database for calculations
-        fee_mappings = execute_query("""
-            SELECT t.name as tour_name, f.name as fee_name, f.per_person_amount
-            FROM tour_fees tf
-            JOIN tours t ON tf.tour_id = t.id
-            JOIN fees f ON tf.fee_id = f.id
-            ORDER BY t.name, f.name
-        """)
-        
-        fee_mappings_df = pd.DataFrame(fee_mappings, columns=['tour_name', 'fee_name', 'per_person_amount']) if fee_mappings else pd.DataFrame()
+        fee_mappings_df = get_tour_fee_mappings()
+
+        # Per-person fee total for each tour
         if not fee_mappings_df.empty:
-            fee_mappings_df['per_person_amount'] = pd.to_numeric(fee_mappings_df['per_person_amount'], errors='coerce').fillna(0)
+            fee_per_person = fee_mappings_df.groupby('tour_name', sort=False)['per_person_amount'].sum().rename('fee_per_person')
+        else:
+            fee_per_person = pd.Series(dtype=float, name='fee_per_person')
+
+        # Work on payment and refund transactions as whole columns (already numeric from the loader)
+        transactions = df[df['Payment or Refund'].isin(['Payment', 'Refund'])]
+        work = pd.DataFrame({
+            'Payment or Refund': transactions['Payment or Refund'],
+            'Item': transactions['Item'],
+            'subtotal_paid': transactions['Subtotal Paid'],
+            'subtotal_total': transactions['Subtotal'],
+            'guests': transactions['# of Pax'],
+        }).merge(fee_per_person, left_on='Item', right_index=True, how='left').fillna({'fee_per_person': 0})
+
+        # Total fees for each full booking, then the share covered by this transaction
+        total_fees_for_booking = work['fee_per_person'] * work['guests']
+        work['SUM of Fees'] = calculate_proportional_fees_streamlit(
+            work['subtotal_paid'], work['subtotal_total'], total_fees_for_booking
+        )
+
+        # Ex-fee subtotal: payments subtract fees, refunds add them back (subtotal paid is already negative)
+        is_refund = work['Payment or Refund'] == 'Refund'
+        work['SUM of Ex fee sub paid'] = np.where(
+            is_refund,
+            work['subtotal_paid'] + work['SUM of Fees'],
+            work['subtotal_paid'] - work['SUM of Fees']
+        )
+
+        # Categorical keys with tours in report order, so grouping runs on integer codes
+        # and sorted output follows the report
+        work['Item'] = pd.Categorical(work['Item'], categories=df['Item'].dropna().unique())
+        work['Payment or Refund'] = work['Payment or Refund'].astype('category')
+
+        # One block per transaction kind: payments first, then refunds
+        blocks = []
+        for kind, fee_sign in (('Payment', 1), ('Refund', -1)):  # Negative fees for refunds
+            block = (
+                work[work['Payment or Refund'] == kind]
+                .groupby('Item', observed=True)[['SUM of Ex fee sub paid', 'SUM of Fees']]
+                .sum()
+                .reset_index()
+            )
+            block['SUM of Fees'] *= fee_sign
+            block.insert(0, 'Payment or Refund', kind)
+            blocks.append(block)
+        pivot_df = pd.concat(blocks, ignore_index=True)
 
-        # Create the pivot structure
-        pivot_data = []
-        
-        # Get unique tours
-        tours = df['Item'].unique()
-        
-        # Process payments - using proportional fees like test script
-        payments_df = df[df['Payment or Refund'] == 'Payment']
-        for tour in tours:
-            tour_payments = payments_df[payments_df['Item'] == tour]
-            if not tour_payments.empty:
-                total_ex_fee_subtotal = 0
-                total_proportional_fees = 0
-                
-                # Process each payment transaction separately for proportional fees
-                for _, row in tour_payments.iterrows():
-                    subtotal_paid = pd.to_numeric(row.get('Subtotal Paid', 0), errors='coerce')
-                    subtotal_total = pd.to_numeric(row.get('Subtotal', 0), errors='coerce')
-                    guests = pd.to_numeric(row.get('# of Pax', 0), errors='coerce')
-                    
-                    # Calculate total fees for this booking (full booking)
-                    total_fees_for_booking = 0
-                    if not fee_mappings_df.empty:
-                        tour_fees = fee_mappings_df[fee_mappings_df['tour_name'] == tour]
-                        for _, fee_row in tour_fees.iterrows():
-                            total_fees_for_booking += fee_row['per_person_amount'] * guests
-                    
-                    # Calculate proportional fees based on payment amount
-                    proportional_fees = calculate_proportional_fees_streamlit(subtotal_paid, subtotal_total, float(total_fees_for_booking))
-                    
-                    # Ex-fee subtotal = Subtotal Paid - Proportional Fees
-                    ex_fee_subtotal = subtotal_paid - proportional_fees
-                    
-                    total_ex_fee_subtotal += ex_fee_subtotal
-                    total_proportional_fees += proportional_fees
-                
-                pivot_data.append({
-                    'Payment or Refund': 'Payment',
-                    'Item': tour,
-                    'SUM of Ex fee sub paid': total_ex_fee_subtotal,
-                    'SUM of Fees': total_proportional_fees
-                })
-        
-        # Process refunds - using proportional fees like test script
-        refunds_df = df[df['Payment or Refund'] == 'Refund']
-        for tour in tours:
-            tour_refunds = refunds_df[refunds_df['Item'] == tour]
-            if not tour_refunds.empty:
-                total_ex_fee_subtotal = 0
-                total_proportional_fees = 0
-                
-                # Process each refund transaction separately for proportional fees
-                for _, row in tour_refunds.iterrows():
-                    subtotal_paid = pd.to_numeric(row.get('Subtotal Paid', 0), errors='coerce')
-                    subtotal_total = pd.to_numeric(row.get('Subtotal', 0), errors='coerce')
-                    guests = pd.to_numeric(row.get('# of Pax', 0), errors='coerce')
-                    
-                    # Calculate total fees for this booking (full booking)
-                    total_fees_for_booking = 0
-                    if not fee_mappings_df.empty:
-                        tour_fees = fee_mappings_df[fee_mappings_df['tour_name'] == tour]
-                        for _, fee_row in tour_fees.iterrows():
-                            total_fees_for_booking += fee_row['per_person_amount'] * guests
-                    
-                    # Calculate proportional fees based on refund amount
-                    proportional_fees = calculate_proportional_fees_streamlit(subtotal_paid, subtotal_total, float(total_fees_for_booking))
-                    
-                    # Ex-fee subtotal = Subtotal Paid + Proportional Fees (since subtotal_paid is already negative)
-                    ex_fee_subtotal = subtotal_paid + proportional_fees
-                    
-                    total_ex_fee_subtotal += ex_fee_subtotal
-                    total_proportional_fees += proportional_fees
-                
-                pivot_data.append({
-                    'Payment or Refund': 'Refund',
-                    'Item': tour,
-                    'SUM of Ex fee sub paid': total_ex_fee_subtotal,
-                    'SUM of Fees': -total_proportional_fees  # Negative for refunds
-                })
-        
-        # Convert to DataFrame
-        pivot_df = pd.DataFrame(pivot_data)
-        
         if pivot_df.empty:
             st.warning("No data available for pivot table")
             return
@@ -890,27 +869,27 @@ def display_payment_refund_pivot_table(df):
         })
         
         # Add total rows
-        pivot_df = pd.concat([
-            pivot_df,
-            pd.DataFrame([{
+        totals = [
+            {
                 'Payment or Refund': 'Payment Total',
                 'Item': '',
                 'SUM of Ex fee sub paid': payment_totals['SUM of Ex fee sub paid'],
                 'SUM of Fees': payment_totals['SUM of Fees']
-            }]),
-            pd.DataFrame([{
-                'Payment or Refund': 'Refund Total', 
+            },
+            {
+                'Payment or Refund': 'Refund Total',
                 'Item': '',
                 'SUM of Ex fee sub paid': refund_totals['SUM of Ex fee sub paid'],
                 'SUM of Fees': refund_totals['SUM of Fees']
-            }]),
-            pd.DataFrame([{
+            },
+            {
                 'Payment or Refund': 'Grand Total',
                 'Item': '',
                 'SUM of Ex fee sub paid': payment_totals['SUM of Ex fee sub paid'] + refund_totals['SUM of Ex fee sub paid'],
                 'SUM of Fees': payment_totals['SUM of Fees'] + refund_totals['SUM of Fees']
-            }])
-        ], ignore_index=True)
+            }
+        ]
+        pivot_df = pd.concat([pivot_df, pd.DataFrame(totals)], ignore_index=True)
         
         # Format for display
         display_df = pivot_df.copy()
@@ -924,12 +903,7 @@ def display_payment_refund_pivot_table(df):
             display_df,
             use_container_width=True,
             hide_index=True,
-            column_config={
-                "Payment or Refund": st.column_config.TextColumn("Payment or Refund", width="small"),
-                "Item": st.column_config.TextColumn("Item", width="medium"),
-                "SUM of Ex fee sub paid": st.column_config.TextColumn("SUM of Ex fee sub paid", width="medium"),
-                "SUM of Fees": st.column_config.TextColumn("SUM of Fees", width="medium"),
-            }
+            column_config=PAYMENT_REFUND_PIVOT_COLUMN_CONFIG
         )
 
     except Exception as e:
@@ -937,51 +911,49 @@ def display_payment_refund_pivot_table(df):
         # Fallback to original function
         display_pivot_table_fallback(df)
 
+PIVOT_CURRENCY_COLUMNS = ['Total Revenue', 'Gross Payments', 'Total Refunds', 'Net Revenue',
+                          'Receivable from Affiliate', 'Received from Affiliate', 'Net After Refunds', 'Revenue per Guest',
+                          'Subtotal (Ex-Tax)', 'Total Fees per Person', 'Total Fee Revenue', 'Tour Revenue (Net of Fees)', 'Total Tax']
+PIVOT_INTEGER_COLUMNS = ['Total Guests', 'Booking Count']
+PIVOT_COLUMN_LABELS = {
+    "Booking Count": "Bookings",
+    "Total Fee Revenue": "Fee Revenue",
+    "Tour Revenue (Net of Fees)": "Tour Revenue",
+    "Receivable from Affiliate": "Affiliate Due",
+    "Received from Affiliate": "Affiliate Paid",
+}
+
+# Column configs are plain configuration, built once at import rather than on every rerun.
+# The "dollar" preset groups thousands ($12,345.67) like the old f"${x:,.2f}" strings
+PIVOT_COLUMN_CONFIG = {
+    "Tour Name": st.column_config.TextColumn("Tour Name", width="medium"),
+    "Fee Details": st.column_config.TextColumn("Fee Breakdown", width="large"),
+    **{col: st.column_config.NumberColumn(PIVOT_COLUMN_LABELS.get(col, col), format="dollar", width="medium")
+       for col in PIVOT_CURRENCY_COLUMNS},
+    **{col: st.column_config.NumberColumn(PIVOT_COLUMN_LABELS.get(col, col), format="%d", width="small")
+       for col in PIVOT_INTEGER_COLUMNS},
+}
+
 def display_pivot_table(pivot_df):
     """Display the pivot table with nice formatting"""
     try:
         # Keep original numeric data for calculations
-        original_df = pivot_df.copy()
+        original_df = pivot_df
 
-        # Format numeric columns for display
+        # Numeric columns stay numeric; Streamlit formats them client-side via column_config
         display_df = pivot_df.copy()
 
-        # Format currency columns
-        currency_columns = ['Total Revenue', 'Gross Payments', 'Total Refunds', 'Net Revenue',
-                           'Receivable from Affiliate', 'Received from Affiliate', 'Net After Refunds', 'Revenue per Guest',
-                           'Subtotal (Ex-Tax)', 'Total Fees per Person', 'Total Fee Revenue', 'Tour Revenue (Net of Fees)', 'Total Tax']
-
-        for col in currency_columns:
-            if col in display_df.columns:
-                # Ensure the column is numeric before formatting
-                display_df[col] = pd.to_numeric(display_df[col], errors='coerce').fillna(0)
-                display_df[col] = display_df[col].apply(lambda x: f"${x:,.2f}" if pd.notnull(x) else "$0.00")
-
-        # Format integer columns
-        integer_columns = ['Total Guests', 'Booking Count']
-        for col in integer_columns:
+        for col in PIVOT_CURRENCY_COLUMNS + PIVOT_INTEGER_COLUMNS:
             if col in display_df.columns:
-                # Ensure the column is numeric before formatting
+                # Ensure the column is numeric for formatting and sorting
                 display_df[col] = pd.to_numeric(display_df[col], errors='coerce').fillna(0)
-                display_df[col] = display_df[col].apply(lambda x: f"{int(x):,}" if pd.notnull(x) else "0")
 
         # Display the table
         st.dataframe(
             display_df,
             use_container_width=True,
             hide_index=True,
-            column_config={
-                "Tour Name": st.column_config.TextColumn("Tour Name", width="medium"),
-                "Total Guests": st.column_config.TextColumn("Total Guests", width="small"),
-                "Booking Count": st.column_config.TextColumn("Bookings", width="small"),
-                "Subtotal (Ex-Tax)": st.column_config.TextColumn("Subtotal (Ex-Tax)", width="medium"),
-                "Total Fee Revenue": st.column_config.TextColumn("Fee Revenue", width="medium"),
-                "Tour Revenue (Net of Fees)": st.column_config.TextColumn("Tour Revenue", width="medium"),
-                "Total Refunds": st.column_config.TextColumn("Total Refunds", width="medium"),
-                "Receivable from Affiliate": st.column_config.TextColumn("Affiliate Due", width="medium"),
-                "Received from Affiliate": st.column_config.TextColumn("Affiliate Paid", width="medium"),
-                "Fee Details": st.column_config.TextColumn("Fee Breakdown", width="large"),
-            }
+            column_config=PIVOT_COLUMN_CONFIG
         )
 
         # Summary statistics using original numeric data
@@ -1020,8 +992,41 @@ def display_pivot_table_fallback(df):
     if not pivot_data.empty:
         display_pivot_table(pivot_data)
 
+# Breakdown section column configs, built once at import
+AFFILIATE_ANALYSIS_COLUMN_CONFIG = {
+    "Tour Name": st.column_config.TextColumn("Tour Name", width="medium"),
+    "Total Affiliate Revenue (Ex-Tax)": st.column_config.NumberColumn("Affiliate Rev (Ex-Tax)", format="dollar", width="medium"),
+    "Total Affiliate Revenue (Inc-Tax)": st.column_config.NumberColumn("Affiliate Rev (Inc-Tax)", format="dollar", width="medium"),
+    "Paid to Affiliate": st.column_config.NumberColumn("Paid", format="dollar", width="small"),
+    "Receivable from Affiliate": st.column_config.NumberColumn("Receivable", format="dollar", width="small"),
+    "Net Affiliate Position": st.column_config.NumberColumn("Net Position", format="dollar", width="small"),
+}
+NON_AFFILIATE_REVENUE_COLUMN_CONFIG = {
+    "Tour Name": st.column_config.TextColumn("Tour Name", width="medium"),
+    "Non-Affiliate Revenue (Ex-Tax)": st.column_config.NumberColumn("Revenue (Ex-Tax)", format="dollar", width="medium"),
+    "Non-Affiliate Revenue (Inc-Tax)": st.column_config.NumberColumn("Revenue (Inc-Tax)", format="dollar", width="medium"),
+    "Guest Count": st.column_config.NumberColumn("Guests", format="%d", width="small"),
+    "Booking Count": st.column_config.NumberColumn("Bookings", format="%d", width="small"),
+}
+PAYMENT_TYPE_ANALYSIS_COLUMN_CONFIG = {
+    "Tour Name": st.column_config.TextColumn("Tour Name", width="medium"),
+    "Payment Type": st.column_config.TextColumn("Payment Type", width="small"),
+    "Revenue (Ex-Tax)": st.column_config.NumberColumn("Revenue (Ex-Tax)", format="dollar", width="medium"),
+    "Revenue (Inc-Tax)": st.column_config.NumberColumn("Revenue (Inc-Tax)", format="dollar", width="medium"),
+    "Refunds (Ex-Tax)": st.column_config.NumberColumn("Refunds (Ex-Tax)", format="dollar", width="medium"),
+    "Refunds (Inc-Tax)": st.column_config.NumberColumn("Refunds (Inc-Tax)", format="dollar", width="medium"),
+    "Net (Ex-Tax)": st.column_config.NumberColumn("Net (Ex-Tax)", format="dollar", width="medium"),
+}
+NON_AFFILIATE_REFUND_COLUMN_CONFIG = {
+    "Tour Name": st.column_config.TextColumn("Tour Name", width="medium"),
+    "Refunds (Ex-Tax)": st.column_config.NumberColumn("Refunds (Ex-Tax)", format="dollar", width="medium"),
+    "Refunds (Inc-Tax)": st.column_config.NumberColumn("Refunds (Inc-Tax)", format="dollar", width="medium"),
+    "Refund Count": st.column_config.NumberColumn("Refund Count", format="%d", width="small"),
+}
+
+@st.fragment
 def create_payment_affiliate_breakdown(df):
-    """Create detailed payment type and affiliate breakdown analysis"""
+    """Create detailed payment type and affiliate breakdown analysis (a fragment, so its widgets rerun only this section)"""
     st.markdown("""
     <div style="background-color: #f8f9fa; padding: 1.5rem; border-radius: 10px; margin-bottom: 2rem;">
         <h3 style="margin: 0 0 1rem 0; color: #2c3e50;">📈 Payment Type & Affiliate Analysis</h3>
@@ -1029,181 +1034,175 @@ def create_payment_affiliate_breakdown(df):
     </div>
     """, unsafe_allow_html=True)
 
-    # 1. AFFILIATE PAYMENT TYPE REVENUE (PAID/UNPAID) BY TOUR
-    st.subheader("🤝 Affiliate Revenue Analysis by Tour")
-    affiliate_analysis = create_affiliate_revenue_analysis(df)
-    if not affiliate_analysis.empty:
-        st.dataframe(
-            affiliate_analysis,
-            use_container_width=True,
-            hide_index=True,
-            column_config={
-                "Tour Name": st.column_config.TextColumn("Tour Name", width="medium"),
-                "Total Affiliate Revenue (Ex-Tax)": st.column_config.TextColumn("Affiliate Rev (Ex-Tax)", width="medium"),
-                "Total Affiliate Revenue (Inc-Tax)": st.column_config.TextColumn("Affiliate Rev (Inc-Tax)", width="medium"),
-                "Paid to Affiliate": st.column_config.TextColumn("Paid", width="small"),
-                "Receivable from Affiliate": st.column_config.TextColumn("Receivable", width="small"),
-                "Net Affiliate Position": st.column_config.TextColumn("Net Position", width="small"),
-            }
-        )
+    # Split payments and refunds once for the payment type analysis
+    if 'Payment or Refund' in df.columns:
+        payment_or_refund = df['Payment or Refund']
+        revenue_df = df[payment_or_refund.eq('Payment').to_numpy()]
+        refund_df = df[payment_or_refund.eq('Refund').to_numpy()]
     else:
-        st.info("💡 No affiliate payment data found in the selected records.")
+        revenue_df = df
+        refund_df = pd.DataFrame()
 
-    st.markdown("---")
-
-    # 2. NON-AFFILIATE REVENUE BY TOUR
-    st.subheader("🎯 Non-Affiliate Revenue by Tour")
+    # Compute all four analyses up front, then render them in one pass
+    affiliate_analysis = create_affiliate_revenue_analysis(df)
     non_affiliate_revenue = create_non_affiliate_revenue_analysis(df)
-    if not non_affiliate_revenue.empty:
-        st.dataframe(
-            non_affiliate_revenue,
-            use_container_width=True,
-            hide_index=True,
-            column_config={
-                "Tour Name": st.column_config.TextColumn("Tour Name", width="medium"),
-                "Non-Affiliate Revenue (Ex-Tax)": st.column_config.TextColumn("Revenue (Ex-Tax)", width="medium"),
-                "Non-Affiliate Revenue (Inc-Tax)": st.column_config.TextColumn("Revenue (Inc-Tax)", width="medium"),
-                "Guest Count": st.column_config.TextColumn("Guests", width="small"),
-                "Booking Count": st.column_config.TextColumn("Bookings", width="small"),
-            }
-        )
-    else:
-        st.info("💡 No non-affiliate revenue data found.")
-
-    st.markdown("---")
+    payment_type_analysis = create_payment_type_analysis(revenue_df, refund_df)
+    non_affiliate_refunds = create_non_affiliate_refund_analysis(df)
 
-    # 3. PAYMENT TYPE REVENUE AND REFUNDS BY TOUR
-    st.subheader("💳 Payment Type Analysis by Tour")
-    payment_type_analysis = create_payment_type_analysis(df)
-    if not payment_type_analysis.empty:
-        st.dataframe(
+    sections = [
+        (
+            "🤝 Affiliate Revenue Analysis by Tour",
+            affiliate_analysis,
+            AFFILIATE_ANALYSIS_COLUMN_CONFIG,
+            "💡 No affiliate payment data found in the selected records."
+        ),
+        (
+            "🎯 Non-Affiliate Revenue by Tour",
+            non_affiliate_revenue,
+            NON_AFFILIATE_REVENUE_COLUMN_CONFIG,
+            "💡 No non-affiliate revenue data found."
+        ),
+        (
+            "💳 Payment Type Analysis by Tour",
             payment_type_analysis,
-            use_container_width=True,
-            hide_index=True,
-            column_config={
-                "Tour Name": st.column_config.TextColumn("Tour Name", width="medium"),
-                "Payment Type": st.column_config.TextColumn("Payment Type", width="small"),
-                "Revenue (Ex-Tax)": st.column_config.TextColumn("Revenue (Ex-Tax)", width="medium"),
-                "Revenue (Inc-Tax)": st.column_config.TextColumn("Revenue (Inc-Tax)", width="medium"),
-                "Refunds (Ex-Tax)": st.column_config.TextColumn("Refunds (Ex-Tax)", width="medium"),
-                "Refunds (Inc-Tax)": st.column_config.TextColumn("Refunds (Inc-Tax)", width="medium"),
-                "Net (Ex-Tax)": st.column_config.TextColumn("Net (Ex-Tax)", width="medium"),
-            }
-        )
-    else:
-        st.info("💡 No payment type data available.")
-
-    st.markdown("---")
-
-    # 4. NON-AFFILIATE REFUNDS BY TOUR
-    st.subheader("↩️ Non-Affiliate Refunds by Tour")
-    non_affiliate_refunds = create_non_affiliate_refund_analysis(df)
-    if not non_affiliate_refunds.empty:
-        st.dataframe(
+            PAYMENT_TYPE_ANALYSIS_COLUMN_CONFIG,
+            "💡 No payment type data available."
+        ),
+        (
+            "↩️ Non-Affiliate Refunds by Tour",
             non_affiliate_refunds,
-            use_container_width=True,
-            hide_index=True,
-            column_config={
-                "Tour Name": st.column_config.TextColumn("Tour Name", width="medium"),
-                "Refunds (Ex-Tax)": st.column_config.TextColumn("Refunds (Ex-Tax)", width="medium"),
-                "Refunds (Inc-Tax)": st.column_config.TextColumn("Refunds (Inc-Tax)", width="medium"),
-                "Refund Count": st.column_config.TextColumn("Refund Count", width="small"),
-            }
-        )
-    else:
-        st.info("💡 No non-affiliate refund data found.")
-
-    # EXPORT FUNCTIONALITY
-    st.markdown("---")
-    st.subheader("📥 Export Breakdown Data")
-
-    col1, col2, col3, col4 = st.columns(4)
-
-    with col1:
-        if st.button("📊 Export Affiliate Analysis", help="Download affiliate analysis as CSV"):
-            if not affiliate_analysis.empty:
-                csv = affiliate_analysis.to_csv(index=False)
-                st.download_button(
-                label="💾 Download CSV",
-                data=csv,
-                file_name=f"affiliate_analysis_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                mime='text/csv'
-                )
-
-    with col2:
-        if st.button("🎯 Export Non-Affiliate Revenue", help="Download non-affiliate revenue as CSV"):
-            if not non_affiliate_revenue.empty:
-                csv = non_affiliate_revenue.to_csv(index=False)
+            NON_AFFILIATE_REFUND_COLUMN_CONFIG,
+            "💡 No non-affiliate refund data found."
+        ),
+    ]
+
+    exports = [
+        ("📊 Export Affiliate Analysis", "Download affiliate analysis as CSV", affiliate_analysis, "affiliate_analysis"),
+        ("🎯 Export Non-Affiliate Revenue", "Download non-affiliate revenue as CSV", non_affiliate_revenue, "non_affiliate_revenue"),
+        ("💳 Export Payment Type Analysis", "Download payment type analysis as CSV", payment_type_analysis, "payment_type_analysis"),
+        ("↩️ Export Refunds Analysis", "Download refunds analysis as CSV", non_affiliate_refunds, "refunds_analysis"),
+    ]
+
+    with st.container():
+        for i, (title, analysis, column_config, empty_message) in enumerate(sections):
+            if i > 0:
+                st.markdown("---")
+            st.subheader(title)
+            if not analysis.empty:
+                st.dataframe(analysis, use_container_width=True, hide_index=True, column_config=column_config)
+            else:
+                st.info(empty_message)
+
+        # EXPORT FUNCTIONALITY - download buttons render directly with cached CSV bytes,
+        # disabled when there is nothing to export
+        st.markdown("---")
+        st.subheader("📥 Export Breakdown Data")
+
+        # One timestamp per distinct report so file names stay stable across fragment reruns
+        sig = (_frame_digest(df), tuple(df.columns))
+        if st.session_state.get('breakdown_sig') != sig or 'breakdown_ts' not in st.session_state:
+            st.session_state.breakdown_sig = sig
+            st.session_state.breakdown_ts = datetime.now().strftime('%Y%m%d_%H%M%S')
+        timestamp = st.session_state.breakdown_ts
+        for col, (label, help_text, analysis, file_prefix) in zip(st.columns(4), exports):
+            with col:
                 st.download_button(
-                    label="💾 Download CSV",
-                    data=csv,
-                    file_name=f"non_affiliate_revenue_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                    mime='text/csv'
+                    label=label,
+                    data=_csv_bytes(analysis),
+                    file_name=f"{file_prefix}_{timestamp}.csv",
+                    mime='text/csv',
+                    help=help_text,
+                    disabled=analysis.empty
                 )
 
-    with col3:
-        if st.button("💳 Export Payment Type Analysis", help="Download payment type analysis as CSV"):
-            if not payment_type_analysis.empty:
-                csv = payment_type_analysis.to_csv(index=False)
-                st.download_button(
-                    label="💾 Download CSV",
-                    data=csv,
-                    file_name=f"payment_type_analysis_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                    mime='text/csv'
-                )
+# Money columns are summed as whole cents so per-tour totals are exact
+ITEM_SUMMARY_MONEY_COLUMNS = ['Subtotal', 'Total', 'Total Paid', 'Receivable from Affiliate', 'Received from Affiliate']
 
-    with col4:
-        if st.button("↩️ Export Refunds Analysis", help="Download refunds analysis as CSV"):
-            if not non_affiliate_refunds.empty:
-                csv = non_affiliate_refunds.to_csv(index=False)
-                st.download_button(
-                    label="💾 Download CSV",
-                    data=csv,
-                    file_name=f"refunds_analysis_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                    mime='text/csv'
-                )
+@st.cache_data(show_spinner=False, ttl="10m", max_entries=32)
+def _grouped_by_item(df):
+    """Aggregate amounts per tour, split by affiliate and payment/refund, in one pass.
 
+    The tour-level breakdown analyses each read their slice of this result
+    instead of filtering and grouping the full report again.
+    """
+    # Payment Type has few distinct values: test each category once, then select rows by code
+    payment_types = df['Payment Type'].astype('category')
+    affiliate_codes = np.flatnonzero(
+        payment_types.cat.categories.str.contains('affiliate', case=False, regex=False)
+    )
+    is_affiliate = np.isin(payment_types.cat.codes.to_numpy(), affiliate_codes)
+    if 'Payment or Refund' in df.columns:
+        is_refund = df['Payment or Refund'].eq('Refund').to_numpy()
+    else:
+        is_refund = np.zeros(len(df), dtype=bool)
+
+    money_columns = [col for col in ITEM_SUMMARY_MONEY_COLUMNS if col in df.columns]
+    amounts = (df[money_columns].fillna(0) * 100).round().astype('int64')
+    if '# of Pax' in df.columns:
+        amounts['# of Pax'] = df['# of Pax'].fillna(0)
+
+    # One integer code per (tour, affiliate, refund) group, summed with np.bincount;
+    # rows without a tour (code -1) are left out like groupby does
+    item_codes, items = pd.factorize(df['Item'])
+    has_item = item_codes >= 0
+    group_codes = (item_codes * 4 + is_affiliate * 2 + is_refund)[has_item]
+    group_count = len(items) * 4
+
+    row_counts = np.bincount(group_codes, minlength=group_count)
+    present = np.flatnonzero(row_counts)
+    summary = pd.DataFrame(
+        {
+            col: np.bincount(group_codes, weights=amounts[col].to_numpy(dtype=np.float64)[has_item], minlength=group_count)[present]
+            for col in amounts.columns
+        },
+        index=pd.MultiIndex.from_arrays(
+            [items[present // 4], (present // 2 % 2).astype(bool), (present % 2).astype(bool)],
+            names=['Item', 'Is Affiliate', 'Is Refund']
+        )
+    )
+    # Cent totals are whole numbers well within float64's exact range
+    summary[money_columns] = summary[money_columns].round().astype('int64')
+    summary['Row Count'] = row_counts[present]
+    return summary
+
+def _item_summary(df, is_affiliate, is_refund=None):
+    """Per-tour totals (in dollars) for one affiliate/refund slice of the grouped report"""
+    summary = _grouped_by_item(df)
+    keep = summary.index.get_level_values('Is Affiliate') == is_affiliate
+    if is_refund is not None:
+        keep &= summary.index.get_level_values('Is Refund') == is_refund
+
+    item_summary = summary[keep].groupby(level='Item').sum()
+    money_columns = [col for col in ITEM_SUMMARY_MONEY_COLUMNS if col in item_summary.columns]
+    item_summary[money_columns] = item_summary[money_columns] / 100
+    return item_summary.reset_index()
+
+@st.cache_data(show_spinner=False, ttl="10m", max_entries=32)
 def create_affiliate_revenue_analysis(df):
     """Create affiliate payment analysis with paid/unpaid breakdown"""
     try:
-        # Filter for affiliate payments only
-        affiliate_df = df[df['Payment Type'].str.lower().str.contains('affiliate', na=False)].copy()
+        # Per-tour totals for affiliate payments only
+        affiliate_summary = _item_summary(df, is_affiliate=True)
 
-        if affiliate_df.empty:
+        if affiliate_summary.empty:
             return pd.DataFrame()
 
-        # Group by tour and calculate affiliate metrics
-        affiliate_summary = affiliate_df.groupby('Item').agg({
-            'Subtotal': 'sum',  # Ex-tax amount
-            'Total': 'sum',     # Including tax
-            'Total Paid': 'sum',
-            'Receivable from Affiliate': 'sum',
-            'Received from Affiliate': 'sum',
-            '# of Pax': 'sum'
-        }).reset_index()
+        affiliate_summary = affiliate_summary[['Item', 'Subtotal', 'Total', 'Total Paid',
+                                               'Receivable from Affiliate', 'Received from Affiliate', '# of Pax']]
 
         # Calculate net affiliate position
         affiliate_summary['Net Affiliate Position'] = affiliate_summary['Received from Affiliate'] - affiliate_summary['Receivable from Affiliate']
 
         # Format for display
-        display_df = affiliate_summary.copy()
-        display_df.rename(columns={
+        display_df = affiliate_summary.rename(columns={
             'Item': 'Tour Name',
             'Subtotal': 'Total Affiliate Revenue (Ex-Tax)',
             'Total': 'Total Affiliate Revenue (Inc-Tax)',
             'Receivable from Affiliate': 'Receivable from Affiliate',
             'Received from Affiliate': 'Paid to Affiliate'
-        }, inplace=True)
-
-        # Format currency columns
-        currency_cols = ['Total Affiliate Revenue (Ex-Tax)', 'Total Affiliate Revenue (Inc-Tax)',
-                        'Paid to Affiliate', 'Receivable from Affiliate', 'Net Affiliate Position']
-
-        for col in currency_cols:
-            if col in display_df.columns:
-                display_df[col] = display_df[col].apply(lambda x: f"${x:,.2f}" if pd.notnull(x) else "$0.00")
+        })
 
-        # Select and reorder columns
+        # Select and reorder columns (amounts stay numeric, formatted by the caller's column_config)
         final_columns = ['Tour Name', 'Total Affiliate Revenue (Ex-Tax)', 'Total Affiliate Revenue (Inc-Tax)',
                         'Paid to Affiliate', 'Receivable from Affiliate', 'Net Affiliate Position']
         display_df = display_df[final_columns]
@@ -1214,44 +1213,27 @@ def create_affiliate_revenue_analysis(df):
         st.error(f"❌ Error creating affiliate analysis: {str(e)}")
         return pd.DataFrame()
 
+@st.cache_data(show_spinner=False, ttl="10m", max_entries=32)
 def create_non_affiliate_revenue_analysis(df):
     """Create revenue analysis excluding affiliate payments"""
     try:
-        # Filter out affiliate payments
-        non_affiliate_df = df[~df['Payment Type'].str.lower().str.contains('affiliate', na=False)].copy()
+        # Per-tour totals excluding affiliate payments
+        revenue_summary = _item_summary(df, is_affiliate=False)
 
-        if non_affiliate_df.empty:
+        if revenue_summary.empty:
             return pd.DataFrame()
 
-        # Group by tour and calculate metrics
-        revenue_summary = non_affiliate_df.groupby('Item').agg({
-            'Subtotal': 'sum',      # Ex-tax amount
-            'Total': 'sum',         # Including tax
-            '# of Pax': 'sum'
-        }).reset_index()
-
-        # Add booking count
-        booking_counts = non_affiliate_df.groupby('Item').size().reset_index(name='Booking Count')
-        revenue_summary = revenue_summary.merge(booking_counts, on='Item', how='left')
+        revenue_summary = revenue_summary[['Item', 'Subtotal', 'Total', '# of Pax', 'Row Count']].rename(
+            columns={'Row Count': 'Booking Count'}
+        )
 
         # Format for display
-        display_df = revenue_summary.copy()
-        display_df.rename(columns={
+        display_df = revenue_summary.rename(columns={
             'Item': 'Tour Name',
             'Subtotal': 'Non-Affiliate Revenue (Ex-Tax)',
             'Total': 'Non-Affiliate Revenue (Inc-Tax)',
             '# of Pax': 'Guest Count'
-        }, inplace=True)
-
-        # Format currency columns
-        currency_cols = ['Non-Affiliate Revenue (Ex-Tax)', 'Non-Affiliate Revenue (Inc-Tax)']
-        for col in currency_cols:
-            if col in display_df.columns:
-                display_df[col] = display_df[col].apply(lambda x: f"${x:,.2f}" if pd.notnull(x) else "$0.00")
-
-        # Format integer columns
-        display_df['Guest Count'] = display_df['Guest Count'].apply(lambda x: f"{int(x):,}" if pd.notnull(x) else "0")
-        display_df['Booking Count'] = display_df['Booking Count'].apply(lambda x: f"{int(x):,}" if pd.notnull(x) else "0")
+        })
 
         return display_df
 
@@ -1259,13 +1241,10 @@ def create_non_affiliate_revenue_analysis(df):
         st.error(f"❌ Error creating non-affiliate revenue analysis: {str(e)}")
         return pd.DataFrame()
 
-def create_payment_type_analysis(df):
-    """Create payment type revenue and refund analysis by tour"""
+@st.cache_data(show_spinner=False, ttl="10m", max_entries=32)
+def create_payment_type_analysis(revenue_df, refund_df):
+    """Create payment type revenue and refund analysis by tour from the caller's payment/refund split"""
     try:
-        # Separate revenue and refunds
-        revenue_df = df[df['Payment or Refund'] == 'Payment'].copy() if 'Payment or Refund' in df.columns else df.copy()
-        refund_df = df[df['Payment or Refund'] == 'Refund'].copy() if 'Payment or Refund' in df.columns else pd.DataFrame()
-
         # Group revenue by tour and payment type
         if not revenue_df.empty:
             revenue_summary = revenue_df.groupby(['Item', 'Payment Type']).agg({
@@ -1289,27 +1268,24 @@ def create_payment_type_analysis(df):
 
         # Combine revenue and refunds
         if not revenue_summary.empty:
-            combined_df = revenue_summary.copy()
-            combined_df['Revenue_Subtotal'] = combined_df['Subtotal']
-            combined_df['Revenue_Total'] = combined_df['Total']
-            combined_df['Refund_Subtotal'] = 0.0
-            combined_df['Refund_Total'] = 0.0
+            combined_df = revenue_summary.rename(columns={'Subtotal': 'Revenue_Subtotal', 'Total': 'Revenue_Total'})
 
-            # Merge refunds
+            # Join refunds onto the matching tour/payment type rows in one merge
             if not refund_summary.empty:
-                for _, refund_row in refund_summary.iterrows():
-                    mask = (combined_df['Item'] == refund_row['Item']) & (combined_df['Payment Type'] == refund_row['Payment Type'])
-                    if mask.any():
-                        combined_df.loc[mask, 'Refund_Subtotal'] = float(refund_row['Subtotal'])
-                        combined_df.loc[mask, 'Refund_Total'] = float(refund_row['Total'])
+                refund_summary = refund_summary.rename(columns={'Subtotal': 'Refund_Subtotal', 'Total': 'Refund_Total'})
+                combined_df = combined_df.merge(refund_summary, on=['Item', 'Payment Type'], how='left').fillna(
+                    {'Refund_Subtotal': 0.0, 'Refund_Total': 0.0}
+                )
+            else:
+                combined_df['Refund_Subtotal'] = 0.0
+                combined_df['Refund_Total'] = 0.0
 
             # Calculate net amounts
             combined_df['Net_Subtotal'] = combined_df['Revenue_Subtotal'] - combined_df['Refund_Subtotal']
             combined_df['Net_Total'] = combined_df['Revenue_Total'] - combined_df['Refund_Total']
 
             # Format for display
-            display_df = combined_df.copy()
-            display_df.rename(columns={
+            display_df = combined_df.rename(columns={
                 'Item': 'Tour Name',
                 'Revenue_Subtotal': 'Revenue (Ex-Tax)',
                 'Revenue_Total': 'Revenue (Inc-Tax)',
@@ -1317,15 +1293,7 @@ def create_payment_type_analysis(df):
                 'Refund_Total': 'Refunds (Inc-Tax)',
                 'Net_Subtotal': 'Net (Ex-Tax)',
                 'Net_Total': 'Net (Inc-Tax)'
-            }, inplace=True)
-
-            # Format currency columns
-            currency_cols = ['Revenue (Ex-Tax)', 'Revenue (Inc-Tax)', 'Refunds (Ex-Tax)',
-                            'Refunds (Inc-Tax)', 'Net (Ex-Tax)', 'Net (Inc-Tax)']
-
-            for col in currency_cols:
-                if col in display_df.columns:
-                    display_df[col] = display_df[col].apply(lambda x: f"${x:,.2f}" if pd.notnull(x) else "$0.00")
+            })
 
             # Select final columns
             final_columns = ['Tour Name', 'Payment Type', 'Revenue (Ex-Tax)', 'Revenue (Inc-Tax)',
@@ -1340,71 +1308,72 @@ def create_payment_type_analysis(df):
         st.error(f"❌ Error creating payment type analysis: {str(e)}")
         return pd.DataFrame()
 
+@st.cache_data(show_spinner=False, ttl="10m", max_entries=32)
 def create_non_affiliate_refund_analysis(df):
     """Create refund analysis excluding affiliate payments"""
-    try:
-        # Filter for refunds only, excluding affiliates
-        refund_df = df[
-            (df['Payment or Refund'] == 'Refund') &
-            (~df['Payment Type'].str.lower().str.contains('affiliate', na=False))
-        ].copy() if 'Payment or Refund' in df.columns else pd.DataFrame()
-
-        if refund_df.empty:
-            return pd.DataFrame()
-
-        # Group by tour
-        refund_summary = refund_df.groupby('Item').agg({
-            'Subtotal': 'sum',      # Ex-tax (will be negative)
-            'Total': 'sum',         # Including tax (will be negative)
-        }).reset_index()
-
-        # Make refunds positive and add refund count
-        refund_summary['Subtotal'] = refund_summary['Subtotal'].abs()
-        refund_summary['Total'] = refund_summary['Total'].abs()
-
-        # Add refund transaction count
-        refund_counts = refund_df.groupby('Item').size().reset_index(name='Refund Count')
-        refund_summary = refund_summary.merge(refund_counts, on='Item', how='left')
-
-        # Format for display
-        display_df = refund_summary.copy()
-        display_df.rename(columns={
-            'Item': 'Tour Name',
-            'Subtotal': 'Refunds (Ex-Tax)',
-            'Total': 'Refunds (Inc-Tax)'
-        }, inplace=True)
-
-        # Format currency columns
-        currency_cols = ['Refunds (Ex-Tax)', 'Refunds (Inc-Tax)']
-        for col in currency_cols:
-            if col in display_df.columns:
-                display_df[col] = display_df[col].apply(lambda x: f"${x:,.2f}" if pd.notnull(x) else "$0.00")
-
-        # Format refund count
-        display_df['Refund Count'] = display_df['Refund Count'].apply(lambda x: f"{int(x):,}" if pd.notnull(x) else "0")
-
-        return display_df
+    # Missing columns are an expected input shape, not an error
+    required_columns = ['Item', 'Payment or Refund', 'Payment Type', 'Subtotal', 'Total']
+    if any(col not in df.columns for col in required_columns):
+        return pd.DataFrame()
 
-    except Exception as e:
+    try:
+        # Per-tour refund totals, excluding affiliates
+        refund_summary = _item_summary(df, is_affiliate=False, is_refund=True)
+    except (AttributeError, TypeError) as e:
+        # Payment Type is not a string column
         st.error(f"❌ Error creating refund analysis: {str(e)}")
         return pd.DataFrame()
 
+    if refund_summary.empty:
+        return pd.DataFrame()
+
+    refund_summary = refund_summary[['Item', 'Subtotal', 'Total', 'Row Count']].rename(
+        columns={'Row Count': 'Refund Count'}
+    )
+
+    # Make refunds positive (they are negative in the CSV)
+    refund_summary['Subtotal'] = refund_summary['Subtotal'].abs()
+    refund_summary['Total'] = refund_summary['Total'].abs()
+
+    # Format for display
+    display_df = refund_summary.rename(columns={
+        'Item': 'Tour Name',
+        'Subtotal': 'Refunds (Ex-Tax)',
+        'Total': 'Refunds (Inc-Tax)'
+    })
+
+    return display_df
+
+
+# Card payment types (credit/card/visa/mastercard/amex), excluding gift cards
+CREDIT_CARD_PAYMENT_TYPE_RE = re.compile(r'^(?!.*gift)(?=.*(?:credit|card|visa|mastercard|amex))', re.IGNORECASE)
+
+PAYOUT_SELECTION_COLUMN_CONFIG = {
+    "Include": st.column_config.CheckboxColumn("Include", width="small"),
+    "period_end_date": st.column_config.DateColumn("Period End Date", format="YYYY-MM-DD"),
+    "gross_amount": st.column_config.NumberColumn("Gross Amount", format="dollar"),
+    "processing_fee_amount": st.column_config.NumberColumn("Processing Fees", format="dollar"),
+    "net_payout_amount": st.column_config.NumberColumn("Net Payout", format="dollar"),
+}
+PAYOUT_COMPARISON_COLUMN_CONFIG = {
+    "Source": st.column_config.TextColumn("Source", width="small"),
+    "Description": st.column_config.TextColumn("Description", width="medium"),
+    "Amount": st.column_config.NumberColumn("Amount", format="dollar", width="small"),
+    "Details": st.column_config.TextColumn("Details", width="large"),
+}
 
 def create_payout_comparison_section(sales_df):
     """Create payout comparison section with CSV upload and period filtering"""
     try:
         # Check if journal data is available in session state
         journal_available = False
-        journal_df = None
         journal_version = None
         payment_type_totals = {}
         processing_fees_totals = {}
         net_payment_totals = {}
         
         if 'v2_journal_csv' in st.session_state and st.session_state.v2_journal_csv:
-            # Parse V2 journal from CSV string
-            import io
-            journal_df = pd.read_csv(io.StringIO(st.session_state.v2_journal_csv))
+            # The comparison only needs the per-type totals stored with the journal, not the parsed CSV
             payment_type_totals = st.session_state.get('v2_payment_type_totals', {})
             processing_fees_totals = st.session_state.get('v2_processing_fees_totals', {})
             net_payment_totals = st.session_state.get('v2_net_payment_totals', {})
@@ -1425,13 +1394,10 @@ def create_payout_comparison_section(sales_df):
                     st.info("Expected columns: period_end_date, net_payout_amount, gross_amount, processing_fee_amount")
                     return
                 
-                # Convert date column
-                payout_df['period_end_date'] = pd.to_datetime(payout_df['period_end_date'], errors='coerce')
-                
                 # Period selection
                 
                 # Use all payouts by default (no date filtering)
-                filtered_payouts = payout_df.copy()
+                filtered_payouts = payout_df
 
                 if not filtered_payouts.empty:
                     # Show payout table with selection in collapsible container FIRST
@@ -1439,57 +1405,31 @@ def create_payout_comparison_section(sales_df):
                         # Add selection checkboxes (all selected by default)
                         st.markdown("**Select payouts to include in comparison:**")
 
-                        # Header row
-                        col1, col2, col3, col4, col5 = st.columns([1, 2, 2, 2, 2])
-                        with col1:
-                            st.markdown("**Include**")
-                        with col2:
-                            st.markdown("**Period End Date**")
-                        with col3:
-                            st.markdown("**Gross Amount**")
-                        with col4:
-                            st.markdown("**Processing Fees**")
-                        with col5:
-                            st.markdown("**Net Payout**")
-
-                        selected_payouts = []
-                        for idx, row in filtered_payouts.iterrows():
-                            col1, col2, col3, col4, col5 = st.columns([1, 2, 2, 2, 2])
-
-                            with col1:
-                                selected = st.checkbox("", key=f"payout_{idx}", value=True)  # Default to True (selected)
-                                if selected:
-                                    selected_payouts.append(idx)
-
-                            with col2:
-                                st.write(row['period_end_date'].strftime('%Y-%m-%d'))
-                            with col3:
-                                st.write(f"${row['gross_amount']:,.2f}")
-                            with col4:
-                                st.write(f"${row['processing_fee_amount']:,.2f}")
-                            with col5:
-                                st.write(f"${row['net_payout_amount']:,.2f}")
-
-                        # Calculate totals based on SELECTED payouts only
-                        if selected_payouts:
-                            selected_payout_data = filtered_payouts.loc[selected_payouts]
-                            total_gross = selected_payout_data['gross_amount'].sum()
-                            total_processing_fees = selected_payout_data['processing_fee_amount'].sum()
-                            total_net = selected_payout_data['net_payout_amount'].sum()
-                        else:
-                            # If no payouts selected, use zeros
-                            total_gross = 0
-                            total_processing_fees = 0
-                            total_net = 0
+                        # One editable table with an Include column instead of a row of widgets per payout
+                        amount_columns = ['gross_amount', 'processing_fee_amount', 'net_payout_amount']
+                        editor_df = filtered_payouts[['period_end_date'] + amount_columns].assign(Include=True)
+                        edited_payouts = st.data_editor(
+                            editor_df,
+                            use_container_width=True,
+                            hide_index=True,
+                            column_order=['Include', 'period_end_date'] + amount_columns,
+                            disabled=['period_end_date'] + amount_columns,
+                            key="payout_selection",
+                            column_config=PAYOUT_SELECTION_COLUMN_CONFIG
+                        )
+
+                        # Calculate totals based on SELECTED payouts only (zeros if none are selected)
+                        selected_totals = edited_payouts.loc[edited_payouts['Include'], amount_columns].sum()
+                        total_gross = selected_totals['gross_amount']
+                        total_processing_fees = selected_totals['processing_fee_amount']
+                        total_net = selected_totals['net_payout_amount']
 
                     # Show Journal vs Payout Comparison below the collapsible section (but above it in visibility)
                     if payment_type_totals:
                         st.markdown("### ⚖️ Journal vs Payout Comparison (Credit Card Only)")
 
                         # Filter for Credit Card payment types only (exclude gift cards)
-                        credit_card_types = [pt for pt in payment_type_totals.keys() if
-                                           ('credit' in pt.lower() or 'card' in pt.lower() or 'visa' in pt.lower() or 'mastercard' in pt.lower() or 'amex' in pt.lower())
-                                           and 'gift' not in pt.lower()]
+                        credit_card_types = [pt for pt in payment_type_totals if CREDIT_CARD_PAYMENT_TYPE_RE.search(pt)]
 
                         if not credit_card_types:
                             return
@@ -1500,10 +1440,11 @@ def create_payout_comparison_section(sales_df):
                         # Calculate totals for credit card transactions only
                         cc_payment_totals = {pt: amt for pt, amt in payment_type_totals.items() if pt in credit_card_types}
                         cc_processing_fees_totals = {pt: amt for pt, amt in processing_fees_totals.items() if pt in credit_card_types} if processing_fees_totals else {}
+                        cc_has_nonzero_fees = any(cc_processing_fees_totals.values())
                         cc_net_payment_totals = {pt: amt for pt, amt in net_payment_totals.items() if pt in credit_card_types} if net_payment_totals else cc_payment_totals
 
-                        # Create comparison table
-                        comparison_data = []
+                        # Create comparison table, collected column by column
+                        sources, descriptions, amounts, details = [], [], [], []
 
                         # Journal payment types - use NET totals (after processing fees) for credit cards only
                         journal_gross_total = sum(cc_payment_totals.values())
@@ -1511,81 +1452,66 @@ def create_payout_comparison_section(sales_df):
                         journal_net_total = sum(cc_net_payment_totals.values()) if cc_net_payment_totals else journal_gross_total
 
                         # Show gross payment totals (Credit Card only)
-                        comparison_data.append({
-                            'Source': f'{journal_version} Journal Export',
-                            'Description': 'Credit Card Gross Totals',
-                            'Amount': journal_gross_total,
-                            'Details': ', '.join([f"{pt}: ${amt:,.2f}" for pt, amt in cc_payment_totals.items()])
-                        })
+                        sources.append(f'{journal_version} Journal Export')
+                        descriptions.append('Credit Card Gross Totals')
+                        amounts.append(journal_gross_total)
+                        details.append(', '.join([f"{pt}: ${amt:,.2f}" for pt, amt in cc_payment_totals.items()]))
 
                         # Show processing fees if available (Credit Card only)
-                        if cc_processing_fees_totals and any(fee != 0 for fee in cc_processing_fees_totals.values()):
-                            comparison_data.append({
-                                'Source': f'{journal_version} Journal Export',
-                                'Description': 'Credit Card Processing Fee Expenses',
-                                'Amount': journal_processing_fees_total,
-                                'Details': ', '.join([f"{pt}: ${fee:,.2f}" for pt, fee in cc_processing_fees_totals.items() if fee != 0])
-                            })
+                        if cc_has_nonzero_fees:
+                            sources.append(f'{journal_version} Journal Export')
+                            descriptions.append('Credit Card Processing Fee Expenses')
+                            amounts.append(journal_processing_fees_total)
+                            details.append(', '.join([f"{pt}: ${fee:,.2f}" for pt, fee in cc_processing_fees_totals.items() if fee != 0]))
 
                         # Show net payment totals (what should match payout) - Credit Card only
-                        comparison_data.append({
-                            'Source': f'{journal_version} Journal Export',
-                            'Description': 'Credit Card Net Totals (After Fees)',
-                            'Amount': journal_net_total,
-                            'Details': ', '.join([f"{pt}: ${amt:,.2f}" for pt, amt in cc_net_payment_totals.items()]) if cc_net_payment_totals else 'Same as gross (no processing fees)'
-                        })
+                        sources.append(f'{journal_version} Journal Export')
+                        descriptions.append('Credit Card Net Totals (After Fees)')
+                        amounts.append(journal_net_total)
+                        details.append(', '.join([f"{pt}: ${amt:,.2f}" for pt, amt in cc_net_payment_totals.items()]) if cc_net_payment_totals else 'Same as gross (no processing fees)')
 
                         # Add first day refunds adjustment if applicable
                         if first_day_cc_refunds > 0:
-                            comparison_data.append({
-                                'Source': f'{journal_version} Journal Export',
-                                'Description': 'Plus: First Day Credit Card Refunds',
-                                'Amount': first_day_cc_refunds,
-                                'Details': f"Refunds processed on first day (add back to journal total)"
-                            })
+                            sources.append(f'{journal_version} Journal Export')
+                            descriptions.append('Plus: First Day Credit Card Refunds')
+                            amounts.append(first_day_cc_refunds)
+                            details.append(f"Refunds processed on first day (add back to journal total)")
 
                             # Calculate adjusted journal net (ADD refunds back)
                             adjusted_journal_net = journal_net_total + first_day_cc_refunds
-                            comparison_data.append({
-                                'Source': f'{journal_version} Journal Export',
-                                'Description': 'Adjusted Credit Card Net (Plus Refunds)',
-                                'Amount': adjusted_journal_net,
-                                'Details': f"${journal_net_total:,.2f} + ${first_day_cc_refunds:,.2f} first day refunds"
-                            })
+                            sources.append(f'{journal_version} Journal Export')
+                            descriptions.append('Adjusted Credit Card Net (Plus Refunds)')
+                            amounts.append(adjusted_journal_net)
+                            details.append(f"${journal_net_total:,.2f} + ${first_day_cc_refunds:,.2f} first day refunds")
                         else:
                             adjusted_journal_net = journal_net_total
 
                         # Payout totals (now based on selected payouts only)
-                        comparison_data.append({
-                            'Source': 'Payout Report',
-                            'Description': 'Net Payout Amount',
-                            'Amount': total_net,
-                            'Details': f"Gross: ${total_gross:,.2f}, Fees: ${total_processing_fees:,.2f}"
-                        })
+                        sources.append('Payout Report')
+                        descriptions.append('Net Payout Amount')
+                        amounts.append(total_net)
+                        details.append(f"Gross: ${total_gross:,.2f}, Fees: ${total_processing_fees:,.2f}")
 
                         # Calculate difference using ADJUSTED journal totals (Credit Card only)
                         difference = adjusted_journal_net - total_net
-                        comparison_data.append({
-                            'Source': 'Difference',
-                            'Description': 'Credit Card Journal Net - Payout Net',
-                            'Amount': difference,
-                            'Details': f"{'Journal higher' if difference > 0 else 'Payout higher'} by ${abs(difference):,.2f}"
+                        sources.append('Difference')
+                        descriptions.append('Credit Card Journal Net - Payout Net')
+                        amounts.append(difference)
+                        details.append(f"{'Journal higher' if difference > 0 else 'Payout higher'} by ${abs(difference):,.2f}")
+
+                        # Display comparison table (Amount stays numeric, formatted by the column config)
+                        comparison_df = pd.DataFrame({
+                            'Source': sources,
+                            'Description': descriptions,
+                            'Amount': np.asarray(amounts, dtype=np.float64),
+                            'Details': details
                         })
 
-                        # Display comparison table
-                        comparison_df = pd.DataFrame(comparison_data)
-                        comparison_df['Amount'] = comparison_df['Amount'].apply(lambda x: f"${x:,.2f}")
-
                         st.dataframe(
                             comparison_df,
                             use_container_width=True,
                             hide_index=True,
-                            column_config={
-                                "Source": st.column_config.TextColumn("Source", width="small"),
-                                "Description": st.column_config.TextColumn("Description", width="medium"),
-                                "Amount": st.column_config.TextColumn("Amount", width="small"),
-                                "Details": st.column_config.TextColumn("Details", width="large"),
-                            }
+                            column_config=PAYOUT_COMPARISON_COLUMN_CONFIG
                         )
 
                         # Show detailed payment type breakdown (Credit Card only)
@@ -1606,7 +1532,7 @@ def create_payout_comparison_section(sales_df):
                             st.warning(f"⚠️ Significant difference between Credit Card Journal Net and Payout Net (${abs(difference):,.2f}). Review for discrepancies.")
 
                         # Show processing fee validation if available (Credit Card only)
-                        if cc_processing_fees_totals and any(fee != 0 for fee in cc_processing_fees_totals.values()):
+                        if cc_has_nonzero_fees:
                             journal_fees_total = abs(journal_processing_fees_total)
                             payout_fees_total = abs(total_processing_fees)
                             fee_difference = abs(journal_fees_total - payout_fees_total)
@@ -1629,32 +1555,41 @@ def create_payout_comparison_section(sales_df):
 def calculate_first_day_credit_card_refunds(df):
     """Calculate the net refund amount for credit card transactions on the first day of the sales period"""
     try:
-        if df.empty or 'Created At Date' not in df.columns:
+        # Missing columns are an expected input shape (nothing to adjust), not an error
+        required_columns = ['Created At Date', 'Payment or Refund', 'Payment Type', 'Refund Net']
+        if df.empty or any(col not in df.columns for col in required_columns):
             return 0.0
         
-        # Convert date column to datetime
-        df_copy = df.copy()
-        df_copy['Created At Date'] = pd.to_datetime(df_copy['Created At Date'], errors='coerce')
+        # Convert date column to datetime (no copy of the frame, only the columns we need)
+        created_at = pd.to_datetime(df['Created At Date'], errors='coerce')
         
         # Get the first date in the dataset
-        first_date = df_copy['Created At Date'].min()
+        first_date = created_at.min()
         if pd.isna(first_date):
             return 0.0
         
-        # Filter for first day refunds only
-        first_day_refunds = df_copy[
-            (df_copy['Created At Date'].dt.date == first_date.date()) &
-            (df_copy['Payment or Refund'] == 'Refund') &
-            (df_copy['Payment Type'].str.lower().str.contains('credit', na=False)) &
-            (~df_copy['Payment Type'].str.lower().str.contains('gift', na=False))
-        ].copy()
+        # Filter for first day refunds only, lower-casing the payment types once.
+        # Days are compared as datetime64[D] NumPy values against one broadcast scalar; tz-aware
+        # dates are made naive first so the day is the local one rather than the UTC one
+        if created_at.dt.tz is not None:
+            created_at = created_at.dt.tz_localize(None)
+        created_day = created_at.to_numpy().astype('datetime64[D]')
+        payment_types = df['Payment Type'].astype('string').str.lower()
+        is_first_day_refund = (
+            (created_day == np.datetime64(first_date.date(), 'D')) &
+            (df['Payment or Refund'] == 'Refund').to_numpy() &
+            payment_types.str.contains('credit', na=False).to_numpy(dtype=bool) &
+            ~payment_types.str.contains('gift', na=False).to_numpy(dtype=bool)
+        )
         
-        if first_day_refunds.empty:
+        if not is_first_day_refund.any():
             return 0.0
         
         # Sum the "Refund Net" amounts (these should be negative)
-        # Convert to numeric and handle any formatting issues
-        refund_net_col = first_day_refunds['Refund Net'].astype(str).str.replace('$', '').str.replace(',', '').str.replace('"', '')
+        # The loaders usually hand the column over numeric; only text needs $ , and quotes stripped
+        refund_net_col = df.loc[is_first_day_refund, 'Refund Net']
+        if not pd.api.types.is_numeric_dtype(refund_net_col):
+            refund_net_col = refund_net_col.astype(str).str.replace(r'[$,"]', '', regex=True)
         refund_net_amounts = pd.to_numeric(refund_net_col, errors='coerce').fillna(0)
         total_first_day_refunds = refund_net_amounts.sum()
         
@@ -1,7 +1,77 @@
 # Tours and Fees Management View
 import streamlit as st
 import pandas as pd
-from scripts.database import execute_query
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from scripts.database import execute_query, get_database_connection
+from scripts.journal_exports import bump_mappings_version
+
+# Tours, fees and mappings are cached across reruns (every widget interaction reruns
+# the page) and cleared by _clear_tour_fee_caches() whenever this page writes to them
+@st.cache_data(ttl=300, show_spinner=False)
+def _load_tours():
+    """Retrieve tours with their age pricing"""
+    tours = execute_query("""
+        SELECT id, name, 
+               COALESCE(adult_price, 0.00) as adult_price,
+               COALESCE(senior_price, 0.00) as senior_price,
+               COALESCE(youth_price, 0.00) as youth_price,
+               COALESCE(child_price, 0.00) as child_price
+        FROM tours ORDER BY name
+    """)
+    return [tuple(tour) for tour in tours or []]
+
+@st.cache_data(ttl=300, show_spinner=False)
+def _load_fees():
+    """Retrieve fees with their per-person amounts"""
+    fees = execute_query("SELECT id, name, per_person_amount FROM fees ORDER BY name")
+    return [tuple(fee) for fee in fees or []]
+
+@st.cache_data(ttl=300, show_spinner=False)
+def _load_tour_fee_pairs():
+    """Retrieve the (tour_id, fee_id) pairs of the tour-fee mappings"""
+    mappings = execute_query("SELECT tour_id, fee_id FROM tour_fees")
+    return [tuple(mapping) for mapping in mappings or []]
+
+def _clear_tour_fee_caches():
+    """Clear the cached tours, fees and mappings after a write"""
+    _load_tours.clear()
+    _load_fees.clear()
+    _load_tour_fee_pairs.clear()
+    bump_mappings_version()
+
+TOUR_PRICE_COLUMNS = ['adult_price', 'senior_price', 'youth_price', 'child_price']
+
+def _checked_mappings(matrix_df, fee_id_by_column):
+    """Return the (tour_id, fee_id) pairs checked in the mappings matrix"""
+    # Reshape the tour x fee checkbox grid to one row per cell and keep the checked ones
+    cells = matrix_df.melt(id_vars=['tour_id'], value_vars=list(fee_id_by_column),
+                           var_name='fee_column', value_name='checked')
+    checked = cells[cells['checked'].astype(bool)]
+    return set(zip(checked['tour_id'], checked['fee_column'].map(fee_id_by_column)))
+
+@st.dialog("Delete all tours?")
+def _confirm_delete_all_tours():
+    """Confirm and delete every tour in a dialog, without an extra page rerun"""
+    st.warning("⚠️ This deletes ALL tours!")
+    if st.button("Yes, delete all", key="confirm_delete_all_tours", type="primary"):
+        result = execute_query("DELETE FROM tours")
+        if result:
+            st.success("✅ All tours deleted!")
+            _clear_tour_fee_caches()
+            st.rerun()
+
+@st.dialog("Delete all fees?")
+def _confirm_delete_all_fees():
+    """Confirm and delete every fee in a dialog, without an extra page rerun"""
+    st.warning("⚠️ This deletes ALL fees!")
+    if st.button("Yes, delete all", key="confirm_delete_all_fees", type="primary"):
+        result = execute_query("DELETE FROM fees")
+        if result:
+            st.success("✅ All fees deleted!")
+            _clear_tour_fee_caches()
+            st.rerun()
 
 def manage_tours_and_fees():
     """Tours and Fees Management Page"""
@@ -53,165 +123,110 @@ def manage_tours_and_fees():
                     )
                     if result:
                         st.success(f"✅ Tour '{new_tour_name}' added!")
+                        _clear_tour_fee_caches()
                         st.rerun()
                 else:
                     st.error("❌ Please enter a tour name")
 
         # Edit existing tours
-        tours = execute_query("""
-            SELECT id, name, 
-                   COALESCE(adult_price, 0.00) as adult_price,
-                   COALESCE(senior_price, 0.00) as senior_price,
-                   COALESCE(youth_price, 0.00) as youth_price,
-                   COALESCE(child_price, 0.00) as child_price
-            FROM tours ORDER BY name
-        """)
+        tours = _load_tours()
 
         if tours:
             st.write(f"**{len(tours)} tours available**")
-            st.write("*Format: Adult | Senior | Youth | Child prices*")
-
-            # Initialize session state for tour editing
-            if 'tour_edits' not in st.session_state:
-                st.session_state.tour_edits = {
-                    tour[0]: {
-                        'name': tour[1], 
-                        'adult_price': float(tour[2]),
-                        'senior_price': float(tour[3]),
-                        'youth_price': float(tour[4]),
-                        'child_price': float(tour[5])
-                    } for tour in tours
-                }
-
-            for tour in tours:
-                tour_id, original_name, adult_price, senior_price, youth_price, child_price = tour
-                
-                # Tour name row
-                col1, col2 = st.columns([5, 1])
-                with col1:
-                    new_name = st.text_input(
-                        f"Tour {tour_id}",
-                        value=st.session_state.tour_edits.get(tour_id, {}).get('name', original_name),
-                        key=f"tour_name_{tour_id}",
-                        label_visibility="collapsed"
-                    )
-                    st.session_state.tour_edits[tour_id] = st.session_state.tour_edits.get(tour_id, {})
-                    st.session_state.tour_edits[tour_id]['name'] = new_name
-
-                with col2:
-                    if st.button("🗑️", key=f"delete_tour_{tour_id}", help=f"Delete '{original_name}'"):
-                        result = execute_query("DELETE FROM tours WHERE id = :id", {"id": tour_id})
-                        if result:
-                            st.success(f"✅ Tour '{original_name}' deleted!")
-                            if tour_id in st.session_state.tour_edits:
-                                del st.session_state.tour_edits[tour_id]
-                            st.rerun()
 
-                # Age-based pricing row
-                col1, col2, col3, col4 = st.columns(4)
-                with col1:
-                    new_adult_price = st.number_input(
-                        f"Adult {tour_id}",
-                        value=st.session_state.tour_edits.get(tour_id, {}).get('adult_price', float(adult_price)),
-                        min_value=0.0,
-                        step=0.01,
-                        key=f"adult_price_{tour_id}",
-                        label_visibility="collapsed"
-                    )
-                    st.session_state.tour_edits[tour_id]['adult_price'] = new_adult_price
-
-                with col2:
-                    new_senior_price = st.number_input(
-                        f"Senior {tour_id}",
-                        value=st.session_state.tour_edits.get(tour_id, {}).get('senior_price', float(senior_price)),
-                        min_value=0.0,
-                        step=0.01,
-                        key=f"senior_price_{tour_id}",
-                        label_visibility="collapsed"
-                    )
-                    st.session_state.tour_edits[tour_id]['senior_price'] = new_senior_price
-
-                with col3:
-                    new_youth_price = st.number_input(
-                        f"Youth {tour_id}",
-                        value=st.session_state.tour_edits.get(tour_id, {}).get('youth_price', float(youth_price)),
-                        min_value=0.0,
-                        step=0.01,
-                        key=f"youth_price_{tour_id}",
-                        label_visibility="collapsed"
-                    )
-                    st.session_state.tour_edits[tour_id]['youth_price'] = new_youth_price
-
-                with col4:
-                    new_child_price = st.number_input(
-                        f"Child {tour_id}",
-                        value=st.session_state.tour_edits.get(tour_id, {}).get('child_price', float(child_price)),
-                        min_value=0.0,
-                        step=0.01,
-                        key=f"child_price_{tour_id}",
-                        label_visibility="collapsed"
+            tours_df = pd.DataFrame(tours, columns=['id', 'name', 'adult_price', 'senior_price', 'youth_price', 'child_price'])
+            tours_df[TOUR_PRICE_COLUMNS] = tours_df[TOUR_PRICE_COLUMNS].astype(float)
+
+            # All tours are edited in one table inside a form, so edits are applied together on Save All.
+            # The editor key carries a version so Reset All and a save start from a fresh table
+            editor_version = st.session_state.get('tours_editor_version', 0)
+            with st.form("tours_edit_form"):
+                edited_tours = st.data_editor(
+                    tours_df,
+                    column_config={
+                        "id": None,
+                        "name": st.column_config.TextColumn("Tour Name", required=True, width="large"),
+                        "adult_price": st.column_config.NumberColumn("Adult", min_value=0.0, step=0.01, format="$%.2f", required=True),
+                        "senior_price": st.column_config.NumberColumn("Senior", min_value=0.0, step=0.01, format="$%.2f", required=True),
+                        "youth_price": st.column_config.NumberColumn("Youth", min_value=0.0, step=0.01, format="$%.2f", required=True),
+                        "child_price": st.column_config.NumberColumn("Child", min_value=0.0, step=0.01, format="$%.2f", required=True),
+                    },
+                    hide_index=True,
+                    use_container_width=True,
+                    key=f"tours_editor_{editor_version}"
+                )
+                save_all_tours = st.form_submit_button("💾 Save All", key="save_all_tours", type="primary")
+
+            if save_all_tours:
+                # Only rows that differ from the database and still have a name are written, in one executemany UPDATE
+                edited_tours['name'] = edited_tours['name'].fillna('').str.strip()
+                changed = edited_tours.ne(tours_df).any(axis=1) & edited_tours['name'].ne('')
+                tour_updates = [
+                    {
+                        "name": name,
+                        "adult_price": float(adult_price),
+                        "senior_price": float(senior_price),
+                        "youth_price": float(youth_price),
+                        "child_price": float(child_price),
+                        "id": int(tour_id)
+                    }
+                    for tour_id, name, adult_price, senior_price, youth_price, child_price
+                    in edited_tours[changed].itertuples(index=False, name=None)
+                ]
+                updated_count = 0
+                if tour_updates:
+                    result = execute_query(
+                        """UPDATE tours SET 
+                           name = :name, 
+                           adult_price = :adult_price,
+                           senior_price = :senior_price,
+                           youth_price = :youth_price,
+                           child_price = :child_price,
+                           updated_at = CURRENT_TIMESTAMP 
+                           WHERE id = :id""",
+                        tour_updates
                     )
-                    st.session_state.tour_edits[tour_id]['child_price'] = new_child_price
+                    if result:
+                        updated_count = len(tour_updates)
+                if updated_count > 0:
+                    st.success(f"✅ Updated {updated_count} tour(s)!")
+                    st.session_state.tours_editor_version = editor_version + 1
+                    _clear_tour_fee_caches()
+                    st.rerun()
+                else:
+                    st.info("💡 No changes detected")
 
-                st.markdown("---")
+            # Delete a single tour (outside the form, so it acts immediately)
+            col1, col2 = st.columns([5, 1])
+            with col1:
+                tour_names = {tour[0]: tour[1] for tour in tours}
+                tour_to_delete = st.selectbox(
+                    "Delete tour",
+                    list(tour_names),
+                    format_func=tour_names.get,
+                    key="delete_tour_choice",
+                    label_visibility="collapsed"
+                )
+            with col2:
+                if st.button("🗑️", key="delete_tour", help="Delete the selected tour"):
+                    original_name = tour_names[tour_to_delete]
+                    result = execute_query("DELETE FROM tours WHERE id = :id", {"id": tour_to_delete})
+                    if result:
+                        st.success(f"✅ Tour '{original_name}' deleted!")
+                        _clear_tour_fee_caches()
+                        st.rerun()
 
             # Quick actions
-            col1, col2, col3 = st.columns(3)
+            col1, col2 = st.columns(2)
             with col1:
                 if st.button("🔄 Reset All", key="reset_tours"):
-                    for tour in tours:
-                        tour_id = tour[0]
-                        st.session_state.tour_edits[tour_id] = {
-                            'name': tour[1], 
-                            'adult_price': float(tour[2]),
-                            'senior_price': float(tour[3]),
-                            'youth_price': float(tour[4]),
-                            'child_price': float(tour[5])
-                        }
+                    st.session_state.tours_editor_version = editor_version + 1
                     st.success("✅ Reset all tours!")
                     st.rerun()
 
             with col2:
-                if st.button("💾 Save All", key="save_all_tours", type="primary"):
-                    updated_count = 0
-                    for tour_id, edit_data in st.session_state.tour_edits.items():
-                        if edit_data['name'].strip():
-                            result = execute_query(
-                                """UPDATE tours SET 
-                                   name = :name, 
-                                   adult_price = :adult_price,
-                                   senior_price = :senior_price,
-                                   youth_price = :youth_price,
-                                   child_price = :child_price,
-                                   updated_at = CURRENT_TIMESTAMP 
-                                   WHERE id = :id""",
-                                {
-                                    "name": edit_data['name'].strip(), 
-                                    "adult_price": edit_data['adult_price'],
-                                    "senior_price": edit_data['senior_price'],
-                                    "youth_price": edit_data['youth_price'],
-                                    "child_price": edit_data['child_price'],
-                                    "id": tour_id
-                                }
-                            )
-                            if result:
-                                updated_count += 1
-                    if updated_count > 0:
-                        st.success(f"✅ Updated {updated_count} tour(s)!")
-                        st.rerun()
-
-            with col3:
                 if st.button("🗑️ Delete All", key="delete_all_tours"):
-                    if st.session_state.get('confirm_delete_all_tours', False):
-                        result = execute_query("DELETE FROM tours")
-                        if result:
-                            st.success("✅ All tours deleted!")
-                            st.session_state.tour_edits = {}
-                            st.session_state.confirm_delete_all_tours = False
-                            st.rerun()
-                    else:
-                        st.session_state.confirm_delete_all_tours = True
-                        st.warning("⚠️ Click again to confirm deletion of ALL tours!")
+                    _confirm_delete_all_tours()
 
         else:
             st.info("🎪 No tours yet. Add your first tour above to get started!")
@@ -234,91 +249,92 @@ def manage_tours_and_fees():
                     )
                     if result:
                         st.success(f"✅ Fee '{new_fee_name}' added!")
+                        _clear_tour_fee_caches()
                         st.rerun()
                 else:
                     st.error("❌ Please enter a fee name")
 
         # Edit existing fees
-        fees = execute_query("SELECT id, name, per_person_amount FROM fees ORDER BY name")
+        fees = _load_fees()
 
         if fees:
             st.write(f"**{len(fees)} fees available**")
 
-            # Initialize session state for fee editing
-            if 'fee_edits' not in st.session_state:
-                st.session_state.fee_edits = {fee[0]: {'name': fee[1], 'amount': float(fee[2])} for fee in fees}
-
-            for fee in fees:
-                fee_id, original_name, original_amount = fee[0], fee[1], fee[2]
-                col1, col2, col3 = st.columns([3, 1.5, 1])
-
-                with col1:
-                    new_name = st.text_input(
-                        f"Fee {fee_id}",
-                        value=st.session_state.fee_edits.get(fee_id, {}).get('name', original_name),
-                        key=f"fee_name_{fee_id}",
-                        label_visibility="collapsed"
-                    )
-                    st.session_state.fee_edits[fee_id] = st.session_state.fee_edits.get(fee_id, {})
-                    st.session_state.fee_edits[fee_id]['name'] = new_name
-
-                with col2:
-                    new_amount = st.number_input(
-                        f"Amount {fee_id}",
-                        value=st.session_state.fee_edits.get(fee_id, {}).get('amount', float(original_amount)),
-                        min_value=0.0,
-                        step=0.01,
-                        key=f"fee_amount_{fee_id}",
-                        label_visibility="collapsed"
+            fees_df = pd.DataFrame(fees, columns=['id', 'name', 'amount'])
+            fees_df['amount'] = fees_df['amount'].astype(float)
+
+            # All fees are edited in one table inside a form, so edits are applied together on Save All.
+            # The editor key carries a version so Reset All and a save start from a fresh table
+            editor_version = st.session_state.get('fees_editor_version', 0)
+            with st.form("fees_edit_form"):
+                edited_fees = st.data_editor(
+                    fees_df,
+                    column_config={
+                        "id": None,
+                        "name": st.column_config.TextColumn("Fee Name", required=True, width="large"),
+                        "amount": st.column_config.NumberColumn("Amount", min_value=0.0, step=0.01, format="$%.2f", required=True),
+                    },
+                    hide_index=True,
+                    use_container_width=True,
+                    key=f"fees_editor_{editor_version}"
+                )
+                save_all_fees = st.form_submit_button("💾 Save All", key="save_all_fees", type="primary")
+
+            if save_all_fees:
+                # Only rows that differ from the database and still have a name are written, in one executemany UPDATE
+                edited_fees['name'] = edited_fees['name'].fillna('').str.strip()
+                changed = edited_fees.ne(fees_df).any(axis=1) & edited_fees['name'].ne('')
+                fee_updates = [
+                    {"name": name, "amount": float(amount), "id": int(fee_id)}
+                    for fee_id, name, amount in edited_fees[changed].itertuples(index=False, name=None)
+                ]
+                updated_count = 0
+                if fee_updates:
+                    result = execute_query(
+                        "UPDATE fees SET name = :name, per_person_amount = :amount, updated_at = CURRENT_TIMESTAMP WHERE id = :id",
+                        fee_updates
                     )
-                    st.session_state.fee_edits[fee_id]['amount'] = new_amount
-
-                with col3:
-                    if st.button("🗑️", key=f"delete_fee_{fee_id}", help=f"Delete '{original_name}'"):
-                        result = execute_query("DELETE FROM fees WHERE id = :id", {"id": fee_id})
-                        if result:
-                            st.success(f"✅ Fee '{original_name}' deleted!")
-                            if fee_id in st.session_state.fee_edits:
-                                del st.session_state.fee_edits[fee_id]
-                            st.rerun()
+                    if result:
+                        updated_count = len(fee_updates)
+                if updated_count > 0:
+                    st.success(f"✅ Updated {updated_count} fee(s)!")
+                    st.session_state.fees_editor_version = editor_version + 1
+                    _clear_tour_fee_caches()
+                    st.rerun()
+                else:
+                    st.info("💡 No changes detected")
+
+            # Delete a single fee (outside the form, so it acts immediately)
+            col1, col2 = st.columns([4.5, 1])
+            with col1:
+                fee_names = {fee[0]: fee[1] for fee in fees}
+                fee_to_delete = st.selectbox(
+                    "Delete fee",
+                    list(fee_names),
+                    format_func=fee_names.get,
+                    key="delete_fee_choice",
+                    label_visibility="collapsed"
+                )
+            with col2:
+                if st.button("🗑️", key="delete_fee", help="Delete the selected fee"):
+                    original_name = fee_names[fee_to_delete]
+                    result = execute_query("DELETE FROM fees WHERE id = :id", {"id": fee_to_delete})
+                    if result:
+                        st.success(f"✅ Fee '{original_name}' deleted!")
+                        _clear_tour_fee_caches()
+                        st.rerun()
 
             # Quick actions
-            col1, col2, col3 = st.columns(3)
+            col1, col2 = st.columns(2)
             with col1:
                 if st.button("🔄 Reset All", key="reset_fees"):
-                    for fee in fees:
-                        fee_id = fee[0]
-                        st.session_state.fee_edits[fee_id] = {'name': fee[1], 'amount': float(fee[2])}
+                    st.session_state.fees_editor_version = editor_version + 1
                     st.success("✅ Reset all fees!")
                     st.rerun()
 
             with col2:
-                if st.button("💾 Save All", key="save_all_fees", type="primary"):
-                    updated_count = 0
-                    for fee_id, edit_data in st.session_state.fee_edits.items():
-                        if edit_data['name'].strip():
-                            result = execute_query(
-                                "UPDATE fees SET name = :name, per_person_amount = :amount, updated_at = CURRENT_TIMESTAMP WHERE id = :id",
-                                {"name": edit_data['name'].strip(), "amount": edit_data['amount'], "id": fee_id}
-                            )
-                            if result:
-                                updated_count += 1
-                    if updated_count > 0:
-                        st.success(f"✅ Updated {updated_count} fee(s)!")
-                        st.rerun()
-
-            with col3:
                 if st.button("🗑️ Delete All", key="delete_all_fees"):
-                    if st.session_state.get('confirm_delete_all', False):
-                        result = execute_query("DELETE FROM fees")
-                        if result:
-                            st.success("✅ All fees deleted!")
-                            st.session_state.fee_edits = {}
-                            st.session_state.confirm_delete_all = False
-                            st.rerun()
-                    else:
-                        st.session_state.confirm_delete_all = True
-                        st.warning("⚠️ Click again to confirm deletion of ALL fees!")
+                    _confirm_delete_all_fees()
 
         else:
             st.info("💰 No fees yet. Add your first fee above to get started!")
@@ -327,15 +343,8 @@ def manage_tours_and_fees():
         st.subheader("🔗 Tour-Fee Mappings")
 
         # Get tours and fees
-        tours = execute_query("""
-            SELECT id, name, 
-                   COALESCE(adult_price, 0.00) as adult_price,
-                   COALESCE(senior_price, 0.00) as senior_price,
-                   COALESCE(youth_price, 0.00) as youth_price,
-                   COALESCE(child_price, 0.00) as child_price
-            FROM tours ORDER BY name
-        """)
-        fees = execute_query("SELECT id, name, per_person_amount FROM fees ORDER BY name")
+        tours = _load_tours()
+        fees = _load_fees()
 
         if not tours:
             st.warning("🎪 Add tours first in the Tours tab.")
@@ -346,21 +355,24 @@ def manage_tours_and_fees():
             return
 
         # Get existing mappings
-        existing_mappings = execute_query("SELECT tour_id, fee_id FROM tour_fees")
-        existing_set = set((mapping[0], mapping[1]) for mapping in existing_mappings) if existing_mappings else set()
-
-        # Create matrix data
-        matrix_data = []
-        for tour in tours:
-            tour_id, tour_name, adult_price, senior_price, youth_price, child_price = tour
-            pricing_display = f"A:${adult_price} S:${senior_price} Y:${youth_price} C:${child_price}"
-            row = {"Tour": f"{tour_name}", "Pricing": pricing_display, "tour_id": tour_id}
-            for fee in fees:
-                fee_id, fee_name, fee_amount = fee[0], fee[1], fee[2]
-                row[f"{fee_name} (${fee_amount})"] = (tour_id, fee_id) in existing_set
-            matrix_data.append(row)
-
-        df = pd.DataFrame(matrix_data)
+        existing_mappings = _load_tour_fee_pairs()
+        existing_set = set(existing_mappings)
+
+        # Fee column labels, built once and shared by the matrix, its config, the save and the summary
+        fee_columns = [f"{fee[1]} (${fee[2]})" for fee in fees]
+
+        # Create the matrix as one tour x fee boolean array, marking each existing mapping by position
+        tour_position = {tour[0]: i for i, tour in enumerate(tours)}
+        fee_position = {fee[0]: j for j, fee in enumerate(fees)}
+        checked = np.zeros((len(tours), len(fees)), dtype=bool)
+        for tour_id, fee_id in existing_set:
+            if tour_id in tour_position and fee_id in fee_position:
+                checked[tour_position[tour_id], fee_position[fee_id]] = True
+
+        df = pd.DataFrame(checked, columns=fee_columns)
+        df.insert(0, "tour_id", [tour[0] for tour in tours])
+        df.insert(0, "Pricing", [f"A:${tour[2]} S:${tour[3]} Y:${tour[4]} C:${tour[5]}" for tour in tours])
+        df.insert(0, "Tour", [tour[1] for tour in tours])
         st.write(f"**{len(tours)} tours × {len(fees)} fees** - Check boxes to assign fees to tours")
 
         # Configure data editor
@@ -370,10 +382,9 @@ def manage_tours_and_fees():
             "tour_id": None
         }
 
-        for fee in fees:
-            fee_id, fee_name, fee_amount = fee[0], fee[1], fee[2]
-            column_config[f"{fee_name} (${fee_amount})"] = st.column_config.CheckboxColumn(
-                fee_name, default=False, width="small"
+        for fee, fee_column in zip(fees, fee_columns):
+            column_config[fee_column] = st.column_config.CheckboxColumn(
+                fee[1], default=False, width="small"
             )
 
         edited_df = st.data_editor(
@@ -384,69 +395,61 @@ def manage_tours_and_fees():
             key="tour_fee_mappings_editor"
         )
 
-        # Save button
-        if not edited_df.equals(df):
+        # Save button (the editor state lists only the touched rows, so no need to compare the whole matrix)
+        editor_state = st.session_state.get("tour_fee_mappings_editor", {})
+        if editor_state.get("edited_rows") or editor_state.get("added_rows") or editor_state.get("deleted_rows"):
             st.warning("⚠️ You have unsaved changes!")
 
         col1, col2, col3 = st.columns(3)
         with col2:
             if st.button("💾 Save Changes", key="save_mappings_table", type="primary"):
                 try:
-                    old_mappings = set()
-                    for _, row in df.iterrows():
-                        tour_id = row["tour_id"]
-                        for fee in fees:
-                            fee_id, fee_name, fee_amount = fee[0], fee[1], fee[2]
-                            if row[f"{fee_name} (${fee_amount})"]:
-                                old_mappings.add((tour_id, fee_id))
-
-                    new_mappings = set()
-                    for _, row in edited_df.iterrows():
-                        tour_id = row["tour_id"]
-                        for fee in fees:
-                            fee_id, fee_name, fee_amount = fee[0], fee[1], fee[2]
-                            if row[f"{fee_name} (${fee_amount})"]:
-                                new_mappings.add((tour_id, fee_id))
+                    fee_id_by_column = {fee_column: fee[0] for fee, fee_column in zip(fees, fee_columns)}
+                    old_mappings = _checked_mappings(df, fee_id_by_column)
+                    new_mappings = _checked_mappings(edited_df, fee_id_by_column)
 
                     added = new_mappings - old_mappings
                     removed = old_mappings - new_mappings
 
                     if added or removed:
-                        execute_query("DELETE FROM tour_fees")
-                        if new_mappings:
-                            for tour_id, fee_id in new_mappings:
-                                execute_query("INSERT INTO tour_fees (tour_id, fee_id) VALUES (:tour_id, :fee_id)",
-                                            {"tour_id": tour_id, "fee_id": fee_id})
-
-                        st.success(f"✅ Saved! {len(added)} added, {len(removed)} removed. Total: {len(new_mappings)}")
-                        st.rerun()
+                        saved = False
+                        engine = get_database_connection()
+                        if engine is None:
+                            st.error("❌ Error saving: no database connection")
+                        else:
+                            try:
+                                # Apply only the difference, one executemany statement each, in a single transaction
+                                with engine.begin() as conn:
+                                    if removed:
+                                        conn.execute(text("DELETE FROM tour_fees WHERE tour_id = :tour_id AND fee_id = :fee_id"),
+                                                    [{"tour_id": int(tour_id), "fee_id": int(fee_id)} for tour_id, fee_id in removed])
+                                    if added:
+                                        conn.execute(text("INSERT INTO tour_fees (tour_id, fee_id) VALUES (:tour_id, :fee_id)"),
+                                                    [{"tour_id": int(tour_id), "fee_id": int(fee_id)} for tour_id, fee_id in added])
+                                saved = True
+                            except SQLAlchemyError as e:
+                                # Rolled back as a whole, so the caches still match the database
+                                st.error(f"❌ Error saving: {e}")
+
+                        if saved:
+                            st.success(f"✅ Saved! {len(added)} added, {len(removed)} removed. Total: {len(new_mappings)}")
+                            _clear_tour_fee_caches()
+                            st.rerun()
                     else:
                         st.info("💡 No changes detected")
 
                 except Exception as e:
                     st.error(f"❌ Error saving: {e}")
 
-        # Current mappings summary
+        # Current mappings summary, read from the matrix already built above instead of a join query
         st.markdown("---")
-        current_mappings = execute_query("""
-            SELECT t.name as tour_name, f.name as fee_name, f.per_person_amount
-            FROM tour_fees tf
-            JOIN tours t ON tf.tour_id = t.id
-            JOIN fees f ON tf.fee_id = f.id
-            ORDER BY t.name, f.name
-        """)
-
-        if current_mappings:
+        if checked.any():
             st.subheader("📊 Current Mappings")
-            tour_mappings = {}
-            for mapping in current_mappings:
-                tour_name, fee_name, amount = mapping
-                if tour_name not in tour_mappings:
-                    tour_mappings[tour_name] = []
-                tour_mappings[tour_name].append(f"{fee_name} (${amount})")
-
-            for tour_name, fee_list in tour_mappings.items():
-                with st.expander(f"🎪 {tour_name} ({len(fee_list)} fees)"):
+            for tour, tour_checked in zip(tours, checked):
+                fee_list = [fee_columns[j] for j in np.flatnonzero(tour_checked)]
+                if not fee_list:
+                    continue
+                with st.expander(f"🎪 {tour[1]} ({len(fee_list)} fees)"):
                     for fee_info in fee_list:
                         st.write(f"• {fee_info}")
         else: